@@ -0,0 +1,522 @@
+import struct
+import zlib
+
+# Rejestr parserów: typ chunku -> (nagłówek do wyświetlania, funkcja parsująca)
+CHUNK_PARSERS = {}
+
+# Słowo kluczowe ma maksymalnie 79 bajtów, więc separator null jest w pierwszych 80
+MAX_KEYWORD_LENGTH = 79
+_NULL_SEARCH_BLOCK = 256
+
+
+def register_chunk_parser(chunk_type, title):
+    """Dekorator rejestrujący parser dla danego typu chunku."""
+    def register(parse):
+        CHUNK_PARSERS[chunk_type] = (title, parse)
+        return parse
+    return register
+
+
+def _find_null(data, start=0, limit=None):
+    """Szuka bajtu null także w memoryview, kopiując tylko niewielkie fragmenty danych."""
+    end = len(data) if limit is None else min(len(data), start + limit)
+    pos = start
+    while pos < end:
+        block = bytes(data[pos:min(pos + _NULL_SEARCH_BLOCK, end)])
+        index = block.find(b'\x00')
+        if index != -1:
+            return pos + index
+        pos += len(block)
+    return -1
+
+
+def _split_keyword(data):
+    null_byte_index = _find_null(data, 0, MAX_KEYWORD_LENGTH + 1)
+    if null_byte_index == -1:
+        raise ValueError("Nieprawidłowy format - brak separatora null")
+    return bytes(data[:null_byte_index]).decode('latin-1'), null_byte_index + 1
+
+
+class AncillaryRecord:
+    """
+    Bazowa klasa rekordów chunków dodatkowych.
+    fields() zwraca pary (etykieta, wartość) do wyświetlenia, as_dict() - dane do serializacji.
+    """
+    __slots__ = ('chunk_type',)
+    exported = ()
+
+    def fields(self):
+        return []
+
+    def as_dict(self):
+        record = {'type': self.chunk_type}
+        for name in self.exported:
+            record[name] = getattr(self, name)
+        return record
+
+
+class TextRecord(AncillaryRecord):
+    __slots__ = ('keyword', 'text')
+    exported = ('keyword', 'text')
+
+    def __init__(self, keyword, text):
+        self.chunk_type = 'tEXt'
+        self.keyword = keyword
+        self.text = text
+
+    def fields(self):
+        return [("Słowo kluczowe", self.keyword), (None, self.text)]
+
+
+class CompressedTextRecord(AncillaryRecord):
+    """Rekord zTXt - tekst dekompresowany dopiero przy pierwszym odczycie atrybutu text."""
+    __slots__ = ('keyword', 'compression_method', '_compressed', '_text')
+    exported = ('keyword', 'compression_method', 'text')
+
+    def __init__(self, keyword, compression_method, compressed):
+        self.chunk_type = 'zTXt'
+        self.keyword = keyword
+        self.compression_method = compression_method
+        self._compressed = compressed
+        self._text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = zlib.decompress(self._compressed).decode('latin-1')
+            self._compressed = None
+        return self._text
+
+    def fields(self):
+        return [("Słowo kluczowe", self.keyword),
+                ("Metoda kompresji", 'Deflate' if self.compression_method == 0 else 'Nieznana'),
+                ("Tekst", self.text)]
+
+
+class InternationalTextRecord(AncillaryRecord):
+    """Rekord iTXt - skompresowany tekst dekompresowany leniwie."""
+    __slots__ = ('keyword', 'compression_flag', 'compression_method', 'language_tag',
+                 'translated_keyword', '_raw', '_text')
+    exported = ('keyword', 'compression_flag', 'compression_method', 'language_tag',
+                'translated_keyword', 'text')
+
+    def __init__(self, keyword, compression_flag, compression_method, language_tag, translated_keyword, raw):
+        self.chunk_type = 'iTXt'
+        self.keyword = keyword
+        self.compression_flag = compression_flag
+        self.compression_method = compression_method
+        self.language_tag = language_tag
+        self.translated_keyword = translated_keyword
+        self._raw = raw
+        self._text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            raw = self._raw
+            if self.compression_flag == 1:
+                if self.compression_method != 0:
+                    return f"[Skompresowany tekst - nieznana metoda kompresji: {self.compression_method}]"
+                raw = zlib.decompress(raw)
+            self._text = bytes(raw).decode('latin-1')
+            self._raw = None
+        return self._text
+
+    def fields(self):
+        text = self.text
+        return [("Słowo kluczowe", self.keyword),
+                ("Flaga kompresji", f"{self.compression_flag} "
+                                    f"({'Skompresowany' if self.compression_flag == 1 else 'Nieskompresowany'})"),
+                ("Metoda kompresji", f"{self.compression_method} "
+                                     f"({'Deflate' if self.compression_method == 0 else 'Brak/Nieznana'})"),
+                ("Tag języka", self.language_tag),
+                ("Przetłumaczone słowo kluczowe", self.translated_keyword),
+                ("Tekst", f"{text[:200]}{'...' if len(text) > 200 else ''}")]
+
+
+class GammaRecord(AncillaryRecord):
+    __slots__ = ('gamma',)
+    exported = ('gamma',)
+
+    def __init__(self, gamma):
+        self.chunk_type = 'gAMA'
+        self.gamma = gamma
+
+    def fields(self):
+        return [("Gamma", f"{self.gamma:.4f}")]
+
+
+class ChromaticityRecord(AncillaryRecord):
+    __slots__ = ('white_point', 'red', 'green', 'blue')
+    exported = ('white_point', 'red', 'green', 'blue')
+
+    def __init__(self, white_point, red, green, blue):
+        self.chunk_type = 'cHRM'
+        self.white_point = white_point
+        self.red = red
+        self.green = green
+        self.blue = blue
+
+    def fields(self):
+        return [(label, f"({x:.5f}, {y:.5f})") for label, (x, y) in (
+            ("Punkt bieli (x, y)", self.white_point),
+            ("Czerwony (x, y)", self.red),
+            ("Zielony (x, y)", self.green),
+            ("Niebieski (x, y)", self.blue))]
+
+
+class SrgbRecord(AncillaryRecord):
+    __slots__ = ('rendering_intent',)
+    exported = ('rendering_intent',)
+    INTENTS = {0: 'Perceptual', 1: 'Relative colorimetric', 2: 'Saturation', 3: 'Absolute colorimetric'}
+
+    def __init__(self, rendering_intent):
+        self.chunk_type = 'sRGB'
+        self.rendering_intent = rendering_intent
+
+    def fields(self):
+        return [("Intent renderowania", self.INTENTS.get(self.rendering_intent, 'Nieznany'))]
+
+
+class BackgroundRecord(AncillaryRecord):
+    __slots__ = ('color_type', 'value')
+    exported = ('color_type', 'value')
+
+    def __init__(self, color_type, value):
+        self.chunk_type = 'bKGD'
+        self.color_type = color_type
+        self.value = value
+
+    def fields(self):
+        if self.color_type is None:
+            return [(None, "(Brak informacji o kolorze lub głębi bitowej)")]
+        if self.color_type in (0, 4):
+            return [("Wartość szarości", self.value[0])]
+        if self.color_type == 3:
+            return [("Indeks palety", self.value[0])]
+        return [("Kolor RGB", f"({self.value[0]}, {self.value[1]}, {self.value[2]})")]
+
+
+class PhysRecord(AncillaryRecord):
+    __slots__ = ('pixels_per_unit_x', 'pixels_per_unit_y', 'unit')
+    exported = ('pixels_per_unit_x', 'pixels_per_unit_y', 'unit')
+    UNITS = {0: 'Brak jednostek (nieznane)', 1: 'Metr'}
+
+    def __init__(self, pixels_per_unit_x, pixels_per_unit_y, unit):
+        self.chunk_type = 'pHYs'
+        self.pixels_per_unit_x = pixels_per_unit_x
+        self.pixels_per_unit_y = pixels_per_unit_y
+        self.unit = unit
+
+    def fields(self):
+        return [("Piksele na jednostkę X", self.pixels_per_unit_x),
+                ("Piksele na jednostkę Y", self.pixels_per_unit_y),
+                ("Jednostka", self.UNITS.get(self.unit, 'Nieznana'))]
+
+
+class IccProfileRecord(AncillaryRecord):
+    """Rekord iCCP - profil ICC dekompresowany dopiero przy odczycie atrybutu profile."""
+    __slots__ = ('profile_name', 'compression_method', '_compressed', '_profile')
+    exported = ('profile_name', 'compression_method', 'compressed_size')
+
+    def __init__(self, profile_name, compression_method, compressed):
+        self.chunk_type = 'iCCP'
+        self.profile_name = profile_name
+        self.compression_method = compression_method
+        self._compressed = compressed
+        self._profile = None
+
+    @property
+    def compressed_size(self):
+        return len(self._compressed)
+
+    @property
+    def profile(self):
+        if self._profile is None:
+            self._profile = zlib.decompress(self._compressed)
+        return self._profile
+
+    def fields(self):
+        return [("Nazwa profilu", self.profile_name),
+                ("Metoda kompresji", 'Deflate' if self.compression_method == 0 else 'Nieznana'),
+                ("Rozmiar profilu (skompresowany)", f"{self.compressed_size} bajtów")]
+
+
+class TimeRecord(AncillaryRecord):
+    __slots__ = ('year', 'month', 'day', 'hour', 'minute', 'second')
+    exported = ('year', 'month', 'day', 'hour', 'minute', 'second')
+
+    def __init__(self, year, month, day, hour, minute, second):
+        self.chunk_type = 'tIME'
+        self.year = year
+        self.month = month
+        self.day = day
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+
+    def fields(self):
+        return [("Data modyfikacji (UTC)", f"{self.year:04d}-{self.month:02d}-{self.day:02d} "
+                                           f"{self.hour:02d}:{self.minute:02d}:{self.second:02d}")]
+
+
+class AnimationControlRecord(AncillaryRecord):
+    """Rekord acTL (APNG) - liczba ramek i powtórzeń animacji."""
+    __slots__ = ('num_frames', 'num_plays')
+    exported = ('num_frames', 'num_plays')
+
+    def __init__(self, num_frames, num_plays):
+        self.chunk_type = 'acTL'
+        self.num_frames = num_frames
+        self.num_plays = num_plays
+
+    def fields(self):
+        return [("Liczba ramek", self.num_frames),
+                ("Liczba powtórzeń", self.num_plays or "bez końca")]
+
+
+# Operacje APNG: zwolnienie obszaru ramki po wyświetleniu i sposób nakładania ramki
+DISPOSE_OPS = {0: 'NONE', 1: 'BACKGROUND', 2: 'PREVIOUS'}
+BLEND_OPS = {0: 'SOURCE', 1: 'OVER'}
+
+
+class FrameControlRecord(AncillaryRecord):
+    """Rekord fcTL (APNG) - położenie, rozmiar, czas wyświetlania i operacje ramki."""
+    __slots__ = ('sequence_number', 'width', 'height', 'x_offset', 'y_offset', 'delay_num', 'delay_den',
+                 'dispose_op', 'blend_op')
+    exported = ('sequence_number', 'width', 'height', 'x_offset', 'y_offset', 'delay_num', 'delay_den',
+                'dispose_op', 'blend_op')
+
+    def __init__(self, sequence_number, width, height, x_offset, y_offset, delay_num, delay_den,
+                 dispose_op, blend_op):
+        self.chunk_type = 'fcTL'
+        self.sequence_number = sequence_number
+        self.width = width
+        self.height = height
+        self.x_offset = x_offset
+        self.y_offset = y_offset
+        self.delay_num = delay_num
+        self.delay_den = delay_den
+        self.dispose_op = dispose_op
+        self.blend_op = blend_op
+
+    @property
+    def delay(self):
+        """Czas wyświetlania ramki w sekundach (mianownik 0 oznacza 1/100 s)."""
+        return self.delay_num / (self.delay_den or 100)
+
+    def fields(self):
+        return [("Numer sekwencji", self.sequence_number),
+                ("Rozmiar", f"{self.width}x{self.height} px, przesunięcie ({self.x_offset}, {self.y_offset})"),
+                ("Czas wyświetlania", f"{self.delay:.3f} s"),
+                ("Zwolnienie", DISPOSE_OPS.get(self.dispose_op, self.dispose_op)),
+                ("Nakładanie", BLEND_OPS.get(self.blend_op, self.blend_op))]
+
+
+class SignificantBitsRecord(AncillaryRecord):
+    __slots__ = ('bits',)
+    exported = ('bits',)
+
+    def __init__(self, bits):
+        self.chunk_type = 'sBIT'
+        self.bits = bits
+
+    def fields(self):
+        return [("Znaczące bity (na kanał)", ", ".join(str(b) for b in self.bits))]
+
+
+class HistogramRecord(AncillaryRecord):
+    __slots__ = ('frequencies',)
+    exported = ('frequencies',)
+
+    def __init__(self, frequencies):
+        self.chunk_type = 'hIST'
+        self.frequencies = frequencies
+
+    def fields(self):
+        used = sum(1 for f in self.frequencies if f)
+        return [("Liczba wpisów", len(self.frequencies)),
+                ("Wpisy o niezerowej częstości", used)]
+
+
+class SuggestedPaletteRecord(AncillaryRecord):
+    """Rekord sPLT - wpisy palety rozpakowywane dopiero przy odczycie atrybutu entries."""
+    __slots__ = ('name', 'sample_depth', '_data', '_entries')
+    exported = ('name', 'sample_depth', 'entry_count')
+
+    def __init__(self, name, sample_depth, data):
+        self.chunk_type = 'sPLT'
+        self.name = name
+        self.sample_depth = sample_depth
+        self._data = data
+        self._entries = None
+
+    @property
+    def entry_count(self):
+        return len(self._data) // (6 if self.sample_depth == 8 else 10)
+
+    @property
+    def entries(self):
+        """Lista krotek (R, G, B, A, częstość)."""
+        if self._entries is None:
+            fmt = '>BBBBH' if self.sample_depth == 8 else '>HHHHH'
+            self._entries = list(struct.iter_unpack(fmt, self._data))
+        return self._entries
+
+    def fields(self):
+        return [("Nazwa palety", self.name),
+                ("Głębia próbek", f"{self.sample_depth} bitów"),
+                ("Liczba wpisów", self.entry_count)]
+
+
+@register_chunk_parser('tEXt', "tEXt - Dane tekstowe")
+def parse_text(data, color_type=None, bit_depth=None):
+    keyword, offset = _split_keyword(data)
+    return TextRecord(keyword, bytes(data[offset:]).decode('latin-1'))
+
+
+@register_chunk_parser('zTXt', "zTXt - Skompresowane dane tekstowe")
+def parse_compressed_text(data, color_type=None, bit_depth=None):
+    keyword, offset = _split_keyword(data)
+    return CompressedTextRecord(keyword, data[offset], data[offset + 1:])
+
+
+@register_chunk_parser('iTXt', "iTXt - Internacjonalizowane dane tekstowe")
+def parse_international_text(data, color_type=None, bit_depth=None):
+    keyword, offset = _split_keyword(data)
+    if offset + 2 > len(data):
+        raise ValueError("Brak Compression Flag/Method w danych iTXt")
+    compression_flag = data[offset]
+    compression_method = data[offset + 1]
+    offset += 2
+
+    lang_tag_end = _find_null(data, offset)
+    if lang_tag_end == -1:
+        raise ValueError("Brak zakończenia Language Tag w danych iTXt")
+    language_tag = bytes(data[offset:lang_tag_end]).decode('latin-1')
+    offset = lang_tag_end + 1
+
+    translated_keyword_end = _find_null(data, offset)
+    if translated_keyword_end == -1:
+        raise ValueError("Brak zakończenia Translated Keyword w danych iTXt")
+    translated_keyword = bytes(data[offset:translated_keyword_end]).decode('latin-1')
+
+    return InternationalTextRecord(keyword, compression_flag, compression_method, language_tag,
+                                   translated_keyword, data[translated_keyword_end + 1:])
+
+
+@register_chunk_parser('gAMA', "gAMA - Wartość gamma")
+def parse_gamma(data, color_type=None, bit_depth=None):
+    return GammaRecord(struct.unpack('>I', data)[0] / 100000.0)
+
+
+@register_chunk_parser('cHRM', "cHRM - Chromatyczność")
+def parse_chromaticity(data, color_type=None, bit_depth=None):
+    values = [v / 100000.0 for v in struct.unpack('>IIIIIIII', data)]
+    return ChromaticityRecord(tuple(values[0:2]), tuple(values[2:4]), tuple(values[4:6]), tuple(values[6:8]))
+
+
+@register_chunk_parser('sRGB', "sRGB - Standardowy profil kolorów RGB")
+def parse_srgb(data, color_type=None, bit_depth=None):
+    return SrgbRecord(data[0])
+
+
+@register_chunk_parser('bKGD', "bKGD - Kolor tła")
+def parse_background(data, color_type=None, bit_depth=None):
+    if color_type is None or bit_depth is None:
+        return BackgroundRecord(None, ())
+    if color_type in (0, 4):  # Skala szarości (+ alfa)
+        value = struct.unpack('>H', data)
+    elif color_type == 3:  # Paleta
+        value = (data[0],)
+    elif color_type in (2, 6):  # RGB (+ alfa)
+        value = struct.unpack('>HHH', data)
+    else:
+        raise ValueError(f"Nieznany typ koloru: {color_type}")
+    return BackgroundRecord(color_type, value)
+
+
+@register_chunk_parser('pHYs', "pHYs - Fizyczne wymiary piksela")
+def parse_phys(data, color_type=None, bit_depth=None):
+    return PhysRecord(*struct.unpack('>IIB', data))
+
+
+@register_chunk_parser('iCCP', "iCCP - Wbudowany profil ICC")
+def parse_icc_profile(data, color_type=None, bit_depth=None):
+    profile_name, offset = _split_keyword(data)
+    return IccProfileRecord(profile_name, data[offset], data[offset + 1:])
+
+
+@register_chunk_parser('tIME', "tIME - Czas ostatniej modyfikacji")
+def parse_time(data, color_type=None, bit_depth=None):
+    return TimeRecord(*struct.unpack('>HBBBBB', data))
+
+
+@register_chunk_parser('sBIT', "sBIT - Znaczące bity")
+def parse_significant_bits(data, color_type=None, bit_depth=None):
+    return SignificantBitsRecord(tuple(bytes(data)))
+
+
+@register_chunk_parser('hIST', "hIST - Histogram palety")
+def parse_histogram(data, color_type=None, bit_depth=None):
+    if len(data) % 2:
+        raise ValueError("Nieprawidłowa długość danych hIST")
+    return HistogramRecord(struct.unpack(f'>{len(data) // 2}H', data))
+
+
+@register_chunk_parser('sPLT', "sPLT - Sugerowana paleta")
+def parse_suggested_palette(data, color_type=None, bit_depth=None):
+    name, offset = _split_keyword(data)
+    sample_depth = data[offset]
+    if sample_depth not in (8, 16):
+        raise ValueError(f"Nieprawidłowa głębia próbek sPLT: {sample_depth}")
+    return SuggestedPaletteRecord(name, sample_depth, data[offset + 1:])
+
+
+@register_chunk_parser('acTL', "acTL - Sterowanie animacją (APNG)")
+def parse_animation_control(data, color_type=None, bit_depth=None):
+    if len(data) != 8:
+        raise ValueError("Nieprawidłowa długość danych acTL")
+    num_frames, num_plays = struct.unpack('>II', data)
+    if num_frames == 0:
+        raise ValueError("Animacja APNG musi mieć co najmniej jedną ramkę")
+    return AnimationControlRecord(num_frames, num_plays)
+
+
+@register_chunk_parser('fcTL', "fcTL - Sterowanie ramką (APNG)")
+def parse_frame_control(data, color_type=None, bit_depth=None):
+    if len(data) != 26:
+        raise ValueError("Nieprawidłowa długość danych fcTL")
+    record = FrameControlRecord(*struct.unpack('>IIIIIHHBB', data))
+    if record.dispose_op not in DISPOSE_OPS or record.blend_op not in BLEND_OPS:
+        raise ValueError("Nieznana operacja zwolnienia lub nakładania ramki fcTL")
+    if record.width == 0 or record.height == 0:
+        raise ValueError("Ramka fcTL ma zerowy rozmiar")
+    return record
+
+
+def iter_ancillary_records(chunks, color_type=None, bit_depth=None, types=None):
+    """
+    Zwraca krotki (chunk, nagłówek, rekord lub wyjątek) dla chunków obsługiwanych przez rejestr.
+    Błąd parsowania nie przerywa iteracji - zamiast rekordu zwracany jest wyjątek.
+    """
+    # Import w funkcji - png_handler importuje ten moduł
+    from png_handler import chunk_payload
+
+    for chunk in chunks:
+        chunk_type = chunk['type']
+        if chunk_type not in CHUNK_PARSERS or (types is not None and chunk_type not in types):
+            continue
+        title, parse = CHUNK_PARSERS[chunk_type]
+        try:
+            record = parse(chunk_payload(chunk), color_type, bit_depth)
+        except Exception as e:
+            record = e
+        yield chunk, title, record
+
+
+def list_keywords(chunks):
+    """Słowa kluczowe chunków tekstowych - bez dekompresji tekstu."""
+    return [record.keyword
+            for _, _, record in iter_ancillary_records(chunks, types=('tEXt', 'zTXt', 'iTXt'))
+            if isinstance(record, AncillaryRecord)]
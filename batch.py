@@ -0,0 +1,122 @@
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from ancillary import iter_ancillary_records
+from png_handler import map_png_file
+from png_verify import verify_chunks
+from utils import parse_ihdr_chunk
+
+
+def expand_inputs(inputs):
+    """
+    Rozwija listę wejść: katalogi (rekurencyjnie, pliki *.png), wzorce glob i pojedyncze pliki.
+    Zwraca generator ścieżek - katalogi nie są listowane z góry w całości.
+    """
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in sorted(files):
+                    if name.lower().endswith('.png'):
+                        yield os.path.join(root, name)
+        elif glob.has_magic(item):
+            yield from sorted(glob.iglob(item, recursive=True))
+        else:
+            yield item
+
+
+def _ancillary_metadata(chunks, color_type, bit_depth):
+    """Metadane z chunków dodatkowych (rejestr parserów z modułu ancillary) jako słowniki."""
+    metadata = []
+    for chunk, _, record in iter_ancillary_records(chunks, color_type, bit_depth):
+        try:
+            if isinstance(record, Exception):
+                raise record
+            metadata.append(record.as_dict())
+        except Exception as e:
+            metadata.append({'type': chunk.type, 'error': str(e)})
+    return metadata
+
+
+def analyze_chunks(chunks, verify=False):
+    """Metadane pliku z indeksu chunków: IHDR, lista chunków, chunki dodatkowe (i weryfikacja CRC)."""
+    if not chunks or chunks[0].type != 'IHDR':
+        raise ValueError("Brakuje chunka IHDR – plik PNG jest nieprawidłowy.")
+    record = {'ihdr': parse_ihdr_chunk(bytes(chunks[0].data))}
+    record['chunks'] = [{'type': chunk.type, 'length': chunk.length} for chunk in chunks]
+    record['ancillary'] = _ancillary_metadata(chunks, record['ihdr']['color_type'], record['ihdr']['bit_depth'])
+    if verify:
+        report = verify_chunks(chunks)
+        record['verify'] = {key: report[key] for key in ('ok', 'bad_chunks', 'truncated')}
+    return record
+
+
+def analyze_file(path, verify=False):
+    """
+    Analizuje jeden plik i zwraca rekord wynikowy (słownik gotowy do zapisu jako JSON).
+    Błędy nie są rzucane - trafiają do pola 'error'.
+    """
+    start = time.perf_counter()
+    record = {'path': path, 'ok': False, 'error': None}
+    try:
+        record.update(analyze_chunks(map_png_file(path), verify))
+        record['ok'] = True
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['seconds'] = round(time.perf_counter() - start, 6)
+    return record
+
+
+def _analyze_group(paths, verify):
+    # Jedno zadanie obejmuje kilka plików, aby ograniczyć narzut komunikacji z procesami
+    return [analyze_file(path, verify) for path in paths]
+
+
+def _groups(paths, size):
+    group = []
+    for path in paths:
+        group.append(path)
+        if len(group) >= size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def run_batch(inputs, output=None, workers=None, chunksize=1, verify=False):
+    """
+    Przetwarza pliki z katalogów/wzorców równolegle w puli procesów.
+    Każdy plik daje jeden rekord JSON Lines zapisywany do output od razu po ukończeniu,
+    więc wolny lub uszkodzony plik nie wstrzymuje pozostałych.
+    Zwraca liczbę (przetworzone, z błędem).
+    """
+    output = output or sys.stdout
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    processed = failed = 0
+
+    def emit(records):
+        nonlocal processed, failed
+        for record in records:
+            processed += 1
+            failed += not record['ok']
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+        output.flush()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for group in _groups(expand_inputs(inputs), max(1, chunksize)):
+            pending.add(executor.submit(_analyze_group, group, verify))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    emit(future.result())
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                emit(future.result())
+
+    return processed, failed
@@ -0,0 +1,205 @@
+"""
+Testy wydajności: generuje syntetyczne pliki PNG (benchmarks/synthetic.py) i mierzy czas,
+przepustowość oraz szczyt pamięci (tracemalloc) dla odczytu pliku, chunków dodatkowych,
+FFT i anonimizacji. Wyniki zapisywane są jako JSON; porównanie z plikiem bazowym
+zgłasza regresje (kod wyjścia 1). Czasy zależą od maszyny, więc plik bazowy tworzy się
+lokalnie (np. przed zmianą) i porównuje z nim wyniki na tej samej maszynie.
+
+    python benchmarks/bench.py --profile quick --output wyniki.json
+    python benchmarks/bench.py --profile quick --save-baseline baseline.json
+    python benchmarks/bench.py --profile quick --baseline baseline.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_processor  # noqa: E402
+import png_handler  # noqa: E402
+from synthetic import write_synthetic_png  # noqa: E402
+from utils import parse_ihdr_chunk  # noqa: E402
+
+# (nazwa, szerokość, wysokość, typ koloru, głębia, rozmiar chunka IDAT)
+COLOR_CASES = [(f"ct{color_type}_d{bit_depth}_512", 512, 512, color_type, bit_depth, 65536)
+               for color_type, bit_depth in ((0, 1), (0, 8), (0, 16), (2, 8), (2, 16), (3, 4), (3, 8),
+                                             (4, 8), (6, 8), (6, 16))]
+IDAT_CASES = [(f"rgb8_1024_idat{size // 1024}k", 1024, 1024, 2, 8, size)
+              for size in (1024, 8192, 65536, 1024 * 1024)]
+SIZE_CASES = {
+    'quick': [(f"rgb8_{size}", size, size, 2, 8, 65536) for size in (256, 2048)],
+    'full': [(f"rgb8_{size}", size, size, 2, 8, 65536) for size in (256, 2048, 4096, 8192)],
+    # 32768 x 32768 = 1 gigapiksel (skala szarości, ok. 1 GiB danych po dekompresji)
+    'giga': [("gray8_32768", 32768, 32768, 0, 8, 1024 * 1024)],
+}
+PROFILES = {
+    'quick': COLOR_CASES[:4] + IDAT_CASES[:2] + SIZE_CASES['quick'],
+    'full': COLOR_CASES + IDAT_CASES + SIZE_CASES['full'],
+    'giga': SIZE_CASES['giga'],
+}
+STAGES = ('read', 'read_stream', 'ancillary', 'fft', 'anonymize')
+# Powyżej tej liczby pikseli FFT liczone jest metodą kafelkową (Welch) - pełne widmo nie zmieści się w pamięci
+FFT_TILE_THRESHOLD = 16 * 1024 * 1024
+FFT_TILE_SIZE = 512
+DEFAULT_TOLERANCE = 0.25
+# Różnice poniżej tych progów traktowane są jako szum pomiaru, a nie regresja
+NOISE_FLOOR = {'seconds': 0.002, 'peak_bytes': 64 * 1024}
+
+
+def _stage_functions(path, pixels, scratch_dir):
+    output_path = os.path.join(scratch_dir, 'anonymized.png')
+    tile_size = FFT_TILE_SIZE if pixels > FFT_TILE_THRESHOLD else None
+
+    def read():
+        return png_handler.read_png_file(path, use_mmap=True)
+
+    def read_stream():
+        return png_handler.read_png_file(path)
+
+    def ancillary():
+        chunks = png_handler.map_png_file(path)
+        ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+        png_handler.print_ancillary_chunks_info(chunks, ihdr_info['color_type'], ihdr_info['bit_depth'])
+
+    def fft():
+        # Bez compute_and_show_fft_from_file - ta wyłapuje wyjątki, a błąd ma przerwać pomiar
+        if tile_size:
+            return image_processor.compute_welch_spectrum(path, tile_size)
+        return image_processor.compute_fft_from_file(path, inverse=True)
+
+    def anonymize():
+        png_handler.anonymize_png(png_handler.map_png_file(path), output_path)
+
+    return {'read': read, 'read_stream': read_stream, 'ancillary': ancillary, 'fft': fft, 'anonymize': anonymize}
+
+
+def measure(function, repeat=3, memory=True):
+    """
+    Najkrótszy czas z repeat uruchomień oraz (osobnym uruchomieniem) szczyt pamięci
+    z tracemalloc - śledzenie alokacji spowalnia kod, więc nie wpływa na pomiar czasu.
+    """
+    sink = io.StringIO()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with redirect_stdout(sink):
+            function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        sink.seek(0)
+        sink.truncate()
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            with redirect_stdout(sink):
+                function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+
+def run_case(case, workdir, stages=STAGES, repeat=3, memory=True):
+    name, width, height, color_type, bit_depth, idat_chunk_size = case
+    path = os.path.join(workdir, f"{name}.png")
+    if not os.path.exists(path):
+        write_synthetic_png(path, width, height, color_type, bit_depth, idat_chunk_size)
+    file_size = os.path.getsize(path)
+    pixels = width * height
+
+    results = {}
+    with tempfile.TemporaryDirectory(dir=workdir) as scratch_dir:
+        functions = _stage_functions(path, pixels, scratch_dir)
+        for stage in stages:
+            seconds, peak = measure(functions[stage], repeat, memory)
+            results[stage] = {
+                'seconds': round(seconds, 6),
+                'mb_per_s': round(file_size / 2 ** 20 / seconds, 3) if seconds else None,
+                'mpix_per_s': round(pixels / 1e6 / seconds, 3) if seconds else None,
+                'peak_bytes': peak,
+            }
+            print(f"  {name:22} {stage:12} {seconds:9.4f} s  {results[stage]['mb_per_s'] or 0:10.2f} MB/s"
+                  f"  {(peak or 0) / 2 ** 20:9.2f} MiB", flush=True)
+    return {'width': width, 'height': height, 'color_type': color_type, 'bit_depth': bit_depth,
+            'idat_chunk_size': idat_chunk_size, 'file_size': file_size, 'stages': results}
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Lista regresji: etapy wolniejsze lub zużywające więcej pamięci niż baseline * (1 + tolerance)."""
+    regressions = []
+    for name, case in results['cases'].items():
+        base_case = baseline.get('cases', {}).get(name)
+        if base_case is None:
+            continue
+        for stage, values in case['stages'].items():
+            base = base_case['stages'].get(stage)
+            if base is None:
+                continue
+            for metric in ('seconds', 'peak_bytes'):
+                new, old = values.get(metric), base.get(metric)
+                if new is None or not old:
+                    continue
+                if new > old * (1 + tolerance) and new - old > NOISE_FLOOR[metric]:
+                    regressions.append({'case': name, 'stage': stage, 'metric': metric,
+                                        'baseline': old, 'current': new, 'ratio': round(new / old, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Testy wydajności na syntetycznych plikach PNG.")
+    parser.add_argument('--profile', default='quick', choices=sorted(PROFILES),
+                        help="zestaw przypadków: quick (domyślnie), full lub giga (1 gigapiksel)")
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=STAGES, help="mierzone etapy")
+    parser.add_argument('--repeat', type=int, default=3, help="liczba powtórzeń pomiaru czasu")
+    parser.add_argument('--no-memory', action='store_true', help="pomiń pomiar pamięci (tracemalloc)")
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'emedia-bench'),
+                        help="katalog na wygenerowane pliki (używane ponownie między uruchomieniami)")
+    parser.add_argument('--output', metavar='PLIK', help="zapisz wyniki jako JSON")
+    parser.add_argument('--baseline', metavar='PLIK', help="porównaj wyniki z plikiem bazowym")
+    parser.add_argument('--save-baseline', metavar='PLIK', help="zapisz wyniki jako nowy plik bazowy")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="dopuszczalny względny wzrost czasu i pamięci (domyślnie 0.25)")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = {
+        'version': 1,
+        'profile': args.profile,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'cases': {},
+    }
+    print(f"=== Testy wydajności ({args.profile}) ===")
+    for case in PROFILES[args.profile]:
+        results['cases'][case[0]] = run_case(case, args.workdir, args.stages, args.repeat, not args.no_memory)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            print(f"Wyniki zapisano do {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n=== Regresje (tolerancja {args.tolerance:.0%}) ===")
+            for item in regressions:
+                print(f"  {item['case']:22} {item['stage']:12} {item['metric']:10} "
+                      f"{item['baseline']} -> {item['current']} (x{item['ratio']})")
+            sys.exit(1)
+        print("\nBrak regresji względem pliku bazowego.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Kontrola czasu startu CLI: uruchamia `python -X importtime main.py <polecenie>` i sprawdza,
+że lekkie polecenia (info, verify) nie ładują NumPy/matplotlib/PIL oraz że łączny czas
+importów mieści się w budżecie. Kod wyjścia 1 oznacza przekroczenie.
+
+    python benchmarks/startup_time.py [--budget-ms 150] [PLIK]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FILE = os.path.join(ROOT, 'test', 'itxt.png')
+FORBIDDEN_MODULES = ('numpy', 'matplotlib', 'PIL')
+DEFAULT_BUDGET_MS = 150
+
+
+def import_times(command, file_path):
+    """
+    Zwraca ({moduł: łączny czas importu w mikrosekundach}, suma czasów importów najwyższego
+    poziomu w mikrosekundach) dla jednego uruchomienia.
+    """
+    # Proces działa w katalogu tymczasowym, więc ścieżka względna musi być rozwinięta wcześniej
+    result = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(ROOT, 'main.py'), command,
+                             os.path.abspath(file_path)],
+                            cwd=tempfile.gettempdir(), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Polecenie '{command}' zakończyło się kodem {result.returncode}:\n{result.stderr}")
+    times = {}
+    top_level_us = 0
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package" (wcięcie = zagnieżdżenie)
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name[1:]
+        if not name.startswith(' '):
+            top_level_us += int(cumulative)
+        times[name.strip()] = int(cumulative)
+    return times, top_level_us
+
+
+def check_command(command, file_path, budget_ms):
+    times, total_us = import_times(command, file_path)
+    forbidden = sorted(name for name in times if name.split('.')[0] in FORBIDDEN_MODULES)
+    total_ms = total_us / 1000
+    ok = not forbidden and total_ms <= budget_ms
+    print(f"{command:8} importy: {total_ms:7.1f} ms (budżet {budget_ms} ms) | "
+          f"ciężkie moduły: {', '.join(forbidden[:5]) or 'brak'} | {'OK' if ok else 'BŁĄD'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kontrola czasu startu poleceń info i verify.")
+    parser.add_argument('file', nargs='?', default=DEFAULT_FILE, help="plik PNG używany w pomiarze")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help="maksymalny łączny czas importów w milisekundach")
+    args = parser.parse_args()
+    results = [check_command(command, args.file, args.budget_ms) for command in ('info', 'verify')]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Generator syntetycznych plików PNG do testów wydajności: dowolny rozmiar (także
+gigapikselowy - obraz generowany i kompresowany pasami wierszy), typ koloru,
+głębia bitowa, rozmiar chunków IDAT oraz zestaw chunków dodatkowych.
+"""
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import png_encoder  # noqa: E402
+from png_decoder import ALLOWED_BIT_DEPTHS, CHANNELS  # noqa: E402
+from png_handler import PNG_SIGNATURE, _write_chunk  # noqa: E402
+
+BAND_ROWS = 256
+
+
+def _ancillary_chunks(count):
+    """Zestaw chunków dodatkowych (powtarzany do liczby count) dla parsera ancillary."""
+    text = b"Syntetyczny opis obrazu do testow wydajnosci. " * 20
+    templates = [
+        ('gAMA', struct.pack('>I', 45455)),
+        ('pHYs', struct.pack('>IIB', 3780, 3780, 1)),
+        ('tIME', struct.pack('>HBBBBB', 2024, 1, 1, 12, 0, 0)),
+        ('tEXt', b'Comment\0' + text),
+        ('zTXt', b'Description\0\0' + zlib.compress(text)),
+        ('iTXt', b'Title\0\x01\0pl\0Tytul\0' + zlib.compress(text)),
+    ]
+    return [templates[i % len(templates)] for i in range(count)]
+
+
+def _band_pixels(rng, y0, rows, width, color_type, bit_depth):
+    """Pas obrazu: gradient z szumem (kompresuje się jak typowe zdjęcie, a nie jak jednolite tło)."""
+    channels = CHANNELS[color_type]
+    limit = (1 << bit_depth) - 1
+    y = np.arange(y0, y0 + rows, dtype=np.float32)[:, None]
+    x = np.arange(width, dtype=np.float32)[None, :]
+    base = (np.sin(x / 37.0) + np.cos(y / 53.0) + 2) / 4
+    if channels > 1:
+        base = base[..., None] + np.linspace(0, 0.25, channels, dtype=np.float32)
+    noise = rng.random(base.shape, dtype=np.float32) * 0.1
+    values = np.clip((base + noise) * limit, 0, limit)
+    return values.astype(np.uint16 if bit_depth == 16 else np.uint8)
+
+
+def write_synthetic_png(path, width, height, color_type=2, bit_depth=8, idat_chunk_size=65536,
+                        ancillary=6, level=6, seed=0):
+    """
+    Zapisuje syntetyczny plik PNG. Pamięć zależy od szerokości obrazu i BAND_ROWS,
+    nie od jego wysokości. Zwraca rozmiar pliku w bajtach.
+    """
+    if bit_depth not in ALLOWED_BIT_DEPTHS.get(color_type, ()):
+        raise ValueError(f"Niedozwolona głębia {bit_depth} dla typu koloru {color_type}")
+    rng = np.random.default_rng(seed)
+    # Filtr Sub nie zależy od poprzedniego wiersza, więc pasy można filtrować niezależnie
+    filter_mode = 0 if color_type == 3 or bit_depth < 8 else 1
+    compressor = zlib.compressobj(level)
+    pending = bytearray()
+
+    with open(path, 'wb') as f:
+        f.write(PNG_SIGNATURE)
+        _write_chunk(f, 'IHDR', png_encoder.build_ihdr(width, height, bit_depth, color_type))
+        if color_type == 3:
+            palette = rng.integers(0, 256, size=(1 << bit_depth, 3), dtype=np.uint8)
+            _write_chunk(f, 'PLTE', palette.tobytes())
+        for chunk_type, data in _ancillary_chunks(ancillary):
+            _write_chunk(f, chunk_type, data)
+
+        for y0 in range(0, height, BAND_ROWS):
+            rows = min(BAND_ROWS, height - y0)
+            band_info = {'width': width, 'height': rows, 'bit_depth': bit_depth, 'color_type': color_type,
+                         'interlace_method': 0}
+            raw = png_encoder.pack_pixels(_band_pixels(rng, y0, rows, width, color_type, bit_depth), band_info)
+            pending += compressor.compress(png_encoder.filter_scanlines(raw, band_info, filter_mode))
+            while len(pending) >= idat_chunk_size:
+                _write_chunk(f, 'IDAT', bytes(pending[:idat_chunk_size]))
+                del pending[:idat_chunk_size]
+        pending += compressor.flush()
+        for start in range(0, len(pending), idat_chunk_size):
+            _write_chunk(f, 'IDAT', bytes(pending[start:start + idat_chunk_size]))
+        _write_chunk(f, 'IEND', b'')
+    return os.path.getsize(path)
@@ -1,59 +1,420 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
 
-import numpy as np
-from PIL import Image
-import matplotlib.pyplot as plt
+import png_cache
+import png_decoder
+import png_handler
+from utils import parse_ihdr_chunk
+
+
+def load_grayscale_image(file_path, chunks=None, cache=None):
+    """
+    Dekoduje obraz PNG do tablicy w skali szarości z już wczytanych chunków (png_decoder.decode_chunks).
+    Jeśli podano już wczytane chunki, plik nie jest otwierany ponownie.
+    Z podanym cache (png_cache.PngCache) zdekodowane tablice są zapamiętywane na dysku.
+    """
+    if chunks is None:
+        chunks = png_handler.map_png_file(file_path)
+
+    def decode():
+        ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+        pixels = png_decoder.decode_chunks(chunks)
+        return png_decoder.to_grayscale(pixels, ihdr_info, png_decoder.find_palette(chunks))
+
+    if cache is None:
+        return decode()
+    return cache.get_or_compute(png_cache.cache_key(chunks), 'gray', decode, chunks)
+
+
+PRECISIONS = {'float64': np.float64, 'float32': np.float32}
+
+
+def _mirror_half_spectrum(half, width, odd=False):
+    """
+    Odtwarza pełne widmo (..., H, W) z połowy zwróconej przez rfft2 dzięki symetrii
+    hermitowskiej: F(-k) = conj(F(k)). Dla amplitudy wartości są symetryczne,
+    dla fazy antysymetryczne (odd=True).
+    """
+    height = half.shape[-2]
+    half_width = half.shape[-1]
+    full = np.empty(half.shape[:-1] + (width,), dtype=half.dtype)
+    full[..., :half_width] = half
+    rows = (-np.arange(height)) % height
+    cols = width - np.arange(half_width, width)
+    mirrored = half[..., rows[:, None], cols]
+    full[..., half_width:] = -mirrored if odd else mirrored
+    return full
+
+
+def compute_fft_spectra(images, precision='float64', inverse=False, shift=True):
+    """
+    Oblicza widmo amplitudowe (w skali log) i fazowe bez użycia GUI.
+    images - pojedynczy obraz (H, W) albo stos obrazów tego samego rozmiaru (N, H, W);
+    stos transformowany jest jednym wywołaniem.
+    Używa transformat dla danych rzeczywistych (rfft2), opcjonalnie w precyzji float32.
+    Odwrotna transformata liczona jest tylko przy inverse=True.
+    Zwraca słownik z tablicami 'magnitude', 'phase' i opcjonalnie 'inverse'.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Nieznana precyzja: {precision} (dostępne: {', '.join(PRECISIONS)})")
+    dtype = PRECISIONS[precision]
+
+    if isinstance(images, (list, tuple)):
+        images = np.stack(images)
+    data = np.asarray(images, dtype=dtype)
+    if data.ndim not in (2, 3):
+        raise ValueError("Oczekiwano obrazu 2D lub stosu obrazów 3D")
+
+    height, width = data.shape[-2:]
+    half = np.fft.rfft2(data)
+    if precision == 'float32':
+        half = half.astype(np.complex64, copy=False)
+
+    # Amplituda i faza liczone tylko na połowie widma, potem odbijane
+    # Dodajemy małą stałą, aby uniknąć logarytmowania zera
+    magnitude_half = 20 * np.log(np.abs(half) + dtype(1e-9))
+    phase_half = np.angle(half)
+
+    magnitude = _mirror_half_spectrum(magnitude_half, width)
+    phase = _mirror_half_spectrum(phase_half, width, odd=True)
+    if shift:
+        # Przesunięcie składowej zerowej do centrum
+        magnitude = np.fft.fftshift(magnitude, axes=(-2, -1))
+        phase = np.fft.fftshift(phase, axes=(-2, -1))
 
-def compute_and_show_fft_from_file(file_path):
+    result = {'magnitude': magnitude, 'phase': phase}
+    if inverse:
+        result['inverse'] = np.fft.irfft2(half, s=(height, width)).astype(dtype, copy=False)
+    return result
+
+
+def compute_fft_from_file(file_path, chunks=None, precision='float64', inverse=False, cache=None,
+                          gray_img=None):
+    """
+    Headless odpowiednik compute_and_show_fft_from_file - zwraca obraz i widma jako tablice.
+    Z podanym cache wyniki wczytywane są z dysku (mapowane), jeśli były już liczone.
+    Przekazany gray_img (już zdekodowany obraz w skali szarości) pomija dekodowanie.
+    """
+    if chunks is None:
+        chunks = png_handler.map_png_file(file_path)
+    if gray_img is None:
+        gray_img = load_grayscale_image(file_path, chunks, cache)
+
+    names = ['magnitude', 'phase'] + (['inverse'] if inverse else [])
+    if cache is not None:
+        key = png_cache.cache_key(chunks)
+        cached = {name: cache.load(key, f"fft_{precision}_{name}", chunks) for name in names}
+        if all(array is not None for array in cached.values()):
+            cached['image'] = gray_img
+            return cached
+
+    result = compute_fft_spectra(gray_img, precision=precision, inverse=inverse)
+    if cache is not None:
+        for name in names:
+            cache.store(key, f"fft_{precision}_{name}", result[name], chunks)
+    result['image'] = gray_img
+    return result
+
+
+def save_fft_spectra(result, output_prefix, fmt='png'):
+    """
+    Zapisuje widma do plików <prefix>_magnitude / <prefix>_phase (oraz _inverse),
+    jako obrazy PNG (fmt='png') lub tablice NumPy (fmt='npy'). Dla stosu obrazów
+    do nazwy dodawany jest numer obrazu. Zwraca listę zapisanych ścieżek.
+    """
+    if fmt not in ('png', 'npy'):
+        raise ValueError(f"Nieznany format zapisu: {fmt}")
+    if fmt == 'png':
+        # matplotlib.image zapisuje bez uruchamiania backendu GUI
+        from matplotlib.image import imsave
+
+    saved = []
+    for name in ('magnitude', 'phase', 'inverse'):
+        if name not in result:
+            continue
+        array = result[name]
+        stack = array if array.ndim == 3 else array[None]
+        for index, image in enumerate(stack):
+            suffix = f"_{index}" if array.ndim == 3 else ""
+            path = f"{output_prefix}_{name}{suffix}.{fmt}"
+            if fmt == 'npy':
+                np.save(path, image)
+            else:
+                imsave(path, image, cmap='gray' if name == 'inverse' else None)
+            saved.append(path)
+    return saved
+
+
+WELCH_TILE_BATCH = 16
+
+
+def _iter_grayscale_rows(chunks):
+    """Dekoduje obraz wiersz po wierszu, zwracając wiersze w skali szarości."""
+    ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+    palette = png_decoder.find_palette(chunks)
+    for row in png_decoder.iter_decoded_rows(png_decoder.iter_idat_data(chunks), ihdr_info):
+        yield png_decoder.to_grayscale(row, ihdr_info, palette)
+
+
+def compute_welch_spectrum(file_path, tile_size=256, overlap=0.5, chunks=None,
+                           scratch_dir=None, precision='float32'):
+    """
+    Szacuje widmo dużego obrazu metodą Welcha: uśrednia widma nakładających się,
+    okienkowanych (okno Hanna) kafelków tile_size x tile_size.
+    Wiersze czytane są przyrostowo z pliku, a pas ostatnich tile_size wierszy
+    przechowywany jest w tymczasowej tablicy mapowanej z dysku - zużycie pamięci
+    zależy od rozmiaru kafelka, nie obrazu. Wynik ma stałą rozdzielczość tile_size.
+    Zwraca słownik z 'magnitude', 'phase' (uśrednione widmo zespolone) i 'tiles'.
+    """
+    import tempfile
+
+    if not 0 <= overlap < 1:
+        raise ValueError("Nakładanie kafelków musi być w przedziale [0, 1)")
+    dtype = PRECISIONS[precision]
+    if chunks is None:
+        chunks = png_handler.map_png_file(file_path)
+    ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+    width, height = ihdr_info['width'], ihdr_info['height']
+
+    tile = min(tile_size, width, height)
+    step = max(1, int(round(tile * (1 - overlap))))
+    column_starts = np.arange(0, width - tile + 1, step)
+    window = np.outer(np.hanning(tile), np.hanning(tile)).astype(dtype)
+
+    power_sum = np.zeros((tile, tile // 2 + 1), dtype=np.float64)
+    complex_sum = np.zeros((tile, tile // 2 + 1), dtype=np.complex128)
+    tiles = 0
+
+    with tempfile.TemporaryFile(dir=scratch_dir) as scratch:
+        # Pierścieniowy bufor ostatnich `tile` wierszy
+        band = np.memmap(scratch, dtype=dtype, mode='w+', shape=(tile, width))
+        for row_index, row in enumerate(_iter_grayscale_rows(chunks)):
+            band[row_index % tile] = row
+            first_row = row_index + 1 - tile
+            if first_row < 0 or first_row % step:
+                continue
+
+            order = (np.arange(first_row, first_row + tile)) % tile
+            for start in range(0, len(column_starts), WELCH_TILE_BATCH):
+                batch = np.stack([band[order, c:c + tile] for c in column_starts[start:start + WELCH_TILE_BATCH]])
+                batch -= batch.mean(axis=(-2, -1), keepdims=True)
+                batch *= window
+                spectrum = np.fft.rfft2(batch)
+                power_sum += (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=0)
+                complex_sum += spectrum.sum(axis=0)
+                tiles += len(batch)
+        del band
+
+    if tiles == 0:
+        raise ValueError("Obraz jest zbyt mały dla wybranego rozmiaru kafelka")
+
+    # Dodajemy małą stałą, aby uniknąć logarytmowania zera
+    magnitude_half = (10 * np.log(power_sum / tiles + 1e-18)).astype(dtype)
+    phase_half = np.angle(complex_sum).astype(dtype)
+    magnitude = np.fft.fftshift(_mirror_half_spectrum(magnitude_half, tile))
+    phase = np.fft.fftshift(_mirror_half_spectrum(phase_half, tile, odd=True))
+    return {'magnitude': magnitude, 'phase': phase, 'tiles': tiles}
+
+
+FILTER_KINDS = ('lowpass', 'highpass', 'bandpass', 'notch')
+MASK_CACHE_SIZE = 32
+
+
+def load_color_channels(file_path, chunks=None):
+    """
+    Dekoduje obraz PNG do stosu kanałów koloru (C, H, W) typu float64 - bez konwersji
+    do skali szarości. Obrazy paletowe rozwijane są do RGB, a wartości 1/2/4-bitowe
+    skalowane do 8 bitów. Kanał alfa zwracany jest osobno (nie jest filtrowany).
+    Zwraca (kanały, alfa lub None, głębia bitowa wyniku: 8 lub 16).
+    """
+    if chunks is None:
+        chunks = png_handler.map_png_file(file_path)
+    ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+    color_type = ihdr_info['color_type']
+    bit_depth = ihdr_info['bit_depth']
+    pixels = png_decoder.decode_chunks(chunks)
+
+    if color_type == 3:
+        palette = png_decoder.find_palette(chunks)
+        if palette is None:
+            raise ValueError("Obraz paletowy wymaga chunka PLTE")
+        pixels = palette[pixels]
+    elif bit_depth < 8:
+        pixels = pixels * (255 // ((1 << bit_depth) - 1))
+    if pixels.ndim == 2:
+        pixels = pixels[..., None]
+
+    alpha = None
+    if color_type in (4, 6):
+        pixels, alpha = pixels[..., :-1], pixels[..., -1]
+    channels = np.moveaxis(pixels, -1, 0).astype(np.float64)
+    return channels, alpha, 16 if bit_depth == 16 else 8
+
+
+def _butterworth_lowpass(radius, cutoff, order):
+    return 1 / (1 + (radius / cutoff) ** (2 * order))
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def _cached_mask(height, width, kind, cutoff, band, notches, notch_radius, order, precision):
+    fy = np.fft.fftfreq(height)[:, None]
+    fx = np.fft.rfftfreq(width)[None, :]
+    if kind == 'notch':
+        mask = np.ones((height, width // 2 + 1))
+        # Każdy punkt (fy, fx) tłumiony jest razem z symetrycznym (-fy, -fx);
+        # odległości liczone są z zawinięciem, jak częstotliwości FFT
+        for notch_y, notch_x in notches:
+            for sign in (1, -1):
+                dy = (fy - sign * notch_y + 0.5) % 1 - 0.5
+                dx = (fx - sign * notch_x + 0.5) % 1 - 0.5
+                mask *= 1 - np.exp(-(dy ** 2 + dx ** 2) / (2 * notch_radius ** 2))
+    else:
+        radius = np.hypot(fy, fx)
+        if kind == 'lowpass':
+            mask = _butterworth_lowpass(radius, cutoff, order)
+        elif kind == 'highpass':
+            mask = 1 - _butterworth_lowpass(radius, cutoff, order)
+        else:
+            low, high = band
+            mask = _butterworth_lowpass(radius, high, order) * (1 - _butterworth_lowpass(radius, low, order))
+    mask = mask.astype(PRECISIONS[precision])
+    # Maska jest współdzielona między wywołaniami - tylko do odczytu
+    mask.flags.writeable = False
+    return mask
+
+
+def frequency_mask(shape, kind, cutoff=0.1, band=None, notches=(), notch_radius=0.01, order=2,
+                   precision='float64'):
+    """
+    Maska filtra w dziedzinie częstotliwości dla połowy widma z rfft2: kształt (H, W // 2 + 1).
+    Częstotliwości podawane są w cyklach na piksel (0 - 0.5).
+    kind: 'lowpass'/'highpass' (cutoff), 'bandpass' (band=(dolna, górna)) - filtry
+    Butterwortha rzędu order, 'notch' (notches=[(fy, fx), ...]) - wycięcie zakłóceń
+    okresowych gaussowskim otoczeniem o promieniu notch_radius.
+    Maski są zapamiętywane dla kształtu i parametrów (lru_cache).
+    """
+    if kind not in FILTER_KINDS:
+        raise ValueError(f"Nieznany filtr: {kind} (dostępne: {', '.join(FILTER_KINDS)})")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Nieznana precyzja: {precision} (dostępne: {', '.join(PRECISIONS)})")
+    if kind in ('lowpass', 'highpass') and not 0 < cutoff <= 0.5:
+        raise ValueError("Częstotliwość odcięcia musi być w przedziale (0, 0.5]")
+    if kind == 'bandpass':
+        if band is None or not 0 < band[0] < band[1] <= 0.5:
+            raise ValueError("Pasmo musi spełniać 0 < dolna < górna <= 0.5")
+        band = (float(band[0]), float(band[1]))
+    if kind == 'notch':
+        if not notches:
+            raise ValueError("Filtr notch wymaga co najmniej jednej częstotliwości (fy, fx)")
+        notches = tuple((float(fy), float(fx)) for fy, fx in notches)
+    height, width = shape[-2:]
+    return _cached_mask(height, width, kind, float(cutoff), band if kind == 'bandpass' else None,
+                        notches if kind == 'notch' else (), float(notch_radius), int(order), precision)
+
+
+def filter_channels(channels, kind, workers=None, precision='float64', **mask_options):
+    """
+    Filtruje stos kanałów (C, H, W) lub pojedynczy obraz (H, W) w dziedzinie częstotliwości:
+    rfft2 całego stosu, mnożenie przez maskę, irfft2. Stos dzielony jest między wątki
+    (NumPy zwalnia GIL podczas FFT); każdy wątek transformuje swoją część jednym wywołaniem.
+    """
+    dtype = PRECISIONS.get(precision)
+    if dtype is None:
+        raise ValueError(f"Nieznana precyzja: {precision} (dostępne: {', '.join(PRECISIONS)})")
+    data = np.asarray(channels, dtype=dtype)
+    if data.ndim not in (2, 3):
+        raise ValueError("Oczekiwano obrazu 2D lub stosu kanałów 3D")
+    mask = frequency_mask(data.shape, kind, precision=precision, **mask_options)
+    size = data.shape[-2:]
+
+    def transform(part):
+        spectrum = np.fft.rfft2(part)
+        spectrum *= mask
+        return np.fft.irfft2(spectrum, s=size).astype(dtype, copy=False)
+
+    workers = workers or os.cpu_count() or 1
+    if data.ndim == 2 or workers == 1 or len(data) == 1:
+        return transform(data)
+    parts = np.array_split(data, min(workers, len(data)))
+    with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+        return np.concatenate(list(executor.map(transform, parts)))
+
+
+def save_channels_png(channels, output_path, bit_depth=8, alpha=None, workers=None):
+    """
+    Zapisuje stos kanałów (C, H, W) jako PNG: 1 kanał - skala szarości, 3 - RGB
+    (z alfą odpowiednio GA lub RGBA). Wartości są zaokrąglane i przycinane do zakresu głębi.
+    """
+    import png_encoder
+
+    channels = np.asarray(channels)
+    if channels.ndim == 2:
+        channels = channels[None]
+    if len(channels) not in (1, 3):
+        raise ValueError("Oczekiwano 1 lub 3 kanałów koloru")
+    dtype = np.uint16 if bit_depth == 16 else np.uint8
+    limit = (1 << bit_depth) - 1
+    planes = [np.clip(np.rint(channel), 0, limit).astype(dtype) for channel in channels]
+    if alpha is not None:
+        planes.append(np.asarray(alpha, dtype=dtype))
+    pixels = np.stack(planes, axis=-1)
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[len(planes)]
+    if len(planes) == 1:
+        pixels = pixels[..., 0]
+
+    height, width = pixels.shape[:2]
+    ihdr_info = {'width': width, 'height': height, 'bit_depth': bit_depth, 'color_type': color_type,
+                 'interlace_method': 0}
+    idat_data = png_encoder.encode_idat(pixels, ihdr_info, workers=workers)
+    png_handler.write_png_chunks(output_path, [
+        ('IHDR', png_encoder.build_ihdr(width, height, bit_depth, color_type)),
+        ('IDAT', idat_data),
+        ('IEND', b''),
+    ])
+
+
+def filter_png_file(file_path, output_path, kind, chunks=None, workers=None, precision='float64',
+                    **mask_options):
+    """
+    Etap filtracji: dekoduje wszystkie kanały koloru, filtruje je w dziedzinie częstotliwości
+    (filter_channels) i zapisuje wynik jako PNG. Zwraca przefiltrowany stos kanałów.
+    """
+    channels, alpha, bit_depth = load_color_channels(file_path, chunks)
+    filtered = filter_channels(channels, kind, workers, precision, **mask_options)
+    save_channels_png(filtered, output_path, bit_depth, alpha, workers)
+    return filtered
+
+
+def compute_and_show_fft_from_file(file_path, chunks=None, tile_size=None, cache=None, gray_img=None,
+                                   precision='float64'):
     """
     Oblicza i wyświetla widmo amplitudowe oraz widmo fazowe za pomocą transformaty Fouriera,
     a także obraz po odwróconej transformacie Fouriera.
+    Przy podanym tile_size widma szacowane są metodą kafelkową (compute_welch_spectrum),
+    co pozwala obsłużyć obrazy niemieszczące się w pamięci.
     """
     try:
-        img = Image.open(file_path)
-        img_array = np.array(img)
-
-        # Konwersja obrazu do skali szarości
-        gray_img_pil = img.convert('L') # L - skala szarości
-        gray_img = np.array(gray_img_pil)
-
-        # Obliczanie FFT
-        fft_img = np.fft.fft2(gray_img)
-        fft_img_shifted = np.fft.fftshift(fft_img) # Przesunięcie składowej zerowej do centrum
-
-        # Widmo Amplitudowe
-        # Dodajemy małą stałą, aby uniknąć logarytmowania zera
-        magnitude_spectrum = 20 * np.log(np.abs(fft_img_shifted) + 1e-9) 
-
-        # Widmo Fazowe
-        phase_spectrum = np.angle(fft_img_shifted)
-
-        # Odwrócenie FFT
-        ifft_img = np.fft.ifft2(fft_img).real
-
-        plt.figure(figsize=(16, 8))
-
-        plt.subplot(1, 4, 1)
-        plt.imshow(gray_img, cmap='gray')
-        plt.title("Oryginalny obraz")
-        plt.axis('off')
-
-        plt.subplot(1, 4, 2)
-        plt.imshow(magnitude_spectrum)
-        plt.title("Widmo Fouriera (amplituda w skali log)")
-        plt.axis('off')
-        
-        plt.subplot(1, 4, 3)
-        plt.imshow(phase_spectrum)
-        plt.title("Widmo Fazowe")
-        plt.axis('off')
-
-        plt.subplot(1, 4, 4)
-        plt.imshow(ifft_img, cmap='gray')
-        plt.title("Obraz po IFFT")
-        plt.axis('off')
+        if tile_size:
+            result = compute_welch_spectrum(file_path, tile_size, chunks=chunks, precision=precision)
+            panels = [('magnitude', "Widmo Fouriera (amplituda w skali log, Welch)", None),
+                      ('phase', "Widmo Fazowe (Welch)", None)]
+        else:
+            result = compute_fft_from_file(file_path, chunks, precision, inverse=True, cache=cache, gray_img=gray_img)
+            panels = [('image', "Oryginalny obraz", 'gray'),
+                      ('magnitude', "Widmo Fouriera (amplituda w skali log)", None),
+                      ('phase', "Widmo Fazowe", None),
+                      ('inverse', "Obraz po IFFT", 'gray')]
+
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(4 * len(panels), 8))
+
+        for index, (name, title, cmap) in enumerate(panels, start=1):
+            plt.subplot(1, len(panels), index)
+            plt.imshow(result[name], cmap=cmap)
+            plt.title(title)
+            plt.axis('off')
 
         plt.tight_layout()
         plt.show()
@@ -1,39 +1,372 @@
+import argparse
 import sys
-import png_handler
-import image_processor
+import png_cache
 
-def main():
-    """Główna funkcja programu."""
-    if len(sys.argv) > 1:
-        file_path = sys.argv[1]
+# Moduły zależne od NumPy/matplotlib (pipeline FFT, png_encoder, png_crypto, image_processor)
+# są importowane dopiero w obsłudze podpolecenia, które ich potrzebuje - dzięki temu
+# 'info' i 'verify' startują bez ładowania ciężkich bibliotek.
+
+COMMANDS = ('run', 'info', 'fft', 'anonymize', 'verify', 'batch', 'encrypt', 'decrypt', 'crypto-benchmark', 'serve', 'filter',
+            'frames')
+
+
+def _cache_options():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--cache', nargs='?', const=png_cache.DEFAULT_CACHE_DIR, metavar='KATALOG',
+                        help="zapamiętuj zdekodowane obrazy i widma FFT na dysku "
+                             f"(domyślnie {png_cache.DEFAULT_CACHE_DIR})")
+    parser.add_argument('--cache-size', type=int, default=png_cache.DEFAULT_MAX_BYTES, metavar='BAJTY',
+                        help="maksymalny rozmiar pamięci podręcznej w bajtach")
+    return parser
+
+
+def _anonymize_options():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--recompress', action='store_true',
+                        help="przy anonimizacji zdekoduj i skompresuj dane obrazu ponownie")
+    parser.add_argument('--level', type=int, default=9, choices=range(0, 10), metavar='0-9',
+                        help="poziom kompresji zlib dla --recompress (domyślnie 9)")
+    # Bez choices=png_encoder.STRATEGIES - import kodera wymaga NumPy; wartość sprawdza anonymize_png
+    parser.add_argument('--strategy', default='default',
+                        help="strategia kompresji zlib dla --recompress: "
+                             "default, filtered, huffman, rle, fixed")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="liczba wątków kompresji dla --recompress (domyślnie liczba rdzeni)")
+    parser.add_argument('--compact-palette', action='store_true',
+                        help="przy anonimizacji usuń nieużywane wpisy palety (obrazy paletowe)")
+    return parser
+
+
+def _profile_options():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--profile', action='store_true',
+                        help="wypisz dla każdego etapu czas, przeczytane bajty i szczyt pamięci (tracemalloc)")
+    return parser
+
+
+def parse_args(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Zgodność wstecz: bez podpolecenia wykonywany jest pełny potok (info, FFT, anonimizacja)
+    if not argv or argv[0] not in COMMANDS and argv[0] not in ('-h', '--help'):
+        argv = ['run'] + argv
+
+    cache_options = _cache_options()
+    anonymize_options = _anonymize_options()
+    profile_options = _profile_options()
+    parser = argparse.ArgumentParser(description="Analiza i anonimizacja plików PNG.")
+    commands = parser.add_subparsers(dest='command', metavar='POLECENIE')
+
+    run = commands.add_parser('run', parents=[cache_options, anonymize_options, profile_options],
+                              help="pełny potok: informacje, FFT i anonimizacja (domyślne)")
+    run.add_argument('paths', nargs='?', metavar='PLIK', help="ścieżka do pliku PNG")
+    run.add_argument('--stages', action='store_true',
+                     help="wypisz podsumowanie etapów (czas, wykorzystane dane, dekodowanie)")
+
+    info = commands.add_parser('info', parents=[profile_options], help="wypisz chunki krytyczne i dodatkowe")
+    info.add_argument('paths', metavar='PLIK', help="ścieżka do pliku PNG")
+    info.add_argument('--raw', action='store_true', help="wypisz też surowe dane i CRC chunków")
+
+    fft = commands.add_parser('fft', parents=[cache_options, profile_options], help="oblicz widmo FFT obrazu")
+    fft.add_argument('paths', metavar='PLIK', help="ścieżka do pliku PNG")
+    fft.add_argument('--tile-size', type=int, default=None, metavar='PIKSELE',
+                     help="widmo Welcha z kafli o podanym rozmiarze (duże obrazy)")
+    fft.add_argument('--precision', default='float64', help="precyzja obliczeń: float32 lub float64")
+    fft.add_argument('--save', metavar='PREFIKS',
+                     help="zapisz widma do plików PREFIKS_*.png zamiast wyświetlać")
+
+    filtering = commands.add_parser('filter', help="filtruj kanały koloru w dziedzinie częstotliwości i zapisz PNG")
+    filtering.add_argument('paths', metavar='PLIK', help="ścieżka do pliku PNG")
+    filtering.add_argument('-o', '--output', default='filtered.png', metavar='PLIK',
+                           help="plik wynikowy (domyślnie filtered.png)")
+    filtering.add_argument('--kind', default='lowpass', help="rodzaj filtra: lowpass, highpass, bandpass, notch")
+    filtering.add_argument('--cutoff', type=float, default=0.1,
+                           help="częstotliwość odcięcia w cyklach na piksel (0 - 0.5)")
+    filtering.add_argument('--band', type=float, nargs=2, metavar=('DOLNA', 'GÓRNA'),
+                           help="pasmo przepustowe dla --kind bandpass")
+    filtering.add_argument('--notch', type=float, nargs=2, action='append', default=[], metavar=('FY', 'FX'),
+                           help="częstotliwość zakłócenia okresowego do wycięcia (można powtarzać)")
+    filtering.add_argument('--notch-radius', type=float, default=0.01, help="promień wycięcia filtra notch")
+    filtering.add_argument('--order', type=int, default=2, help="rząd filtra Butterwortha (domyślnie 2)")
+    filtering.add_argument('--precision', default='float64', help="precyzja obliczeń: float32 lub float64")
+    filtering.add_argument('--threads', type=int, default=None,
+                           help="liczba wątków FFT i kompresji (domyślnie liczba rdzeni)")
+
+    frames = commands.add_parser('frames', help="wypisz ramki animacji APNG, zapisz je lub policz ich widma FFT")
+    frames.add_argument('paths', metavar='PLIK', help="ścieżka do pliku APNG")
+    frames.add_argument('--save', metavar='PREFIKS', help="zapisz złożone ramki do plików PREFIKS_NNNN.png")
+    frames.add_argument('--fft', action='store_true', help="oblicz widmo FFT każdej ramki (w partiach)")
+    frames.add_argument('--threads', type=int, default=None,
+                        help="liczba wątków FFT i kompresji (domyślnie liczba rdzeni)")
+
+    anonymize = commands.add_parser('anonymize', parents=[anonymize_options, profile_options],
+                                    help="usuń chunki dodatkowe i zapisz plik")
+    anonymize.add_argument('paths', metavar='PLIK', help="ścieżka do pliku PNG ('-' - standardowe wejście)")
+    anonymize.add_argument('-o', '--output', default='anonymized.png', metavar='PLIK',
+                           help="plik wynikowy (domyślnie anonymized.png)")
+    anonymize.add_argument('--stream', action='store_true',
+                           help="przetwarzaj strumieniowo, bez wczytywania pliku w całości")
+
+    verify = commands.add_parser('verify', help="sprawdź integralność plików (CRC wszystkich chunków)")
+    verify.add_argument('paths', nargs='+', metavar='PLIK', help="pliki, katalogi lub wzorce glob")
+    verify.add_argument('--adler', action='store_true', help="sprawdź też sumę Adler-32 strumienia IDAT")
+    verify.add_argument('--workers', type=int, default=None,
+                        help="liczba wątków weryfikacji (domyślnie liczba rdzeni)")
+
+    batch = commands.add_parser('batch', help="przetwórz wiele plików równolegle i wypisz wyniki jako JSON Lines")
+    batch.add_argument('paths', nargs='+', metavar='PLIK', help="pliki, katalogi lub wzorce glob")
+    batch.add_argument('--verify', action='store_true', help="dołącz wynik weryfikacji CRC do rekordów")
+    batch.add_argument('--workers', type=int, default=None,
+                       help="liczba procesów (domyślnie liczba rdzeni)")
+    batch.add_argument('--chunksize', type=int, default=1, help="liczba plików w jednym zadaniu")
+    batch.add_argument('--output', metavar='PLIK', help="plik wynikowy JSON Lines (domyślnie standardowe wyjście)")
+
+    for name, output, description in (('encrypt', 'encrypted.png', "zaszyfruj dane obrazu (XTEA)"),
+                                       ('decrypt', 'decrypted.png', "odszyfruj plik utworzony przez encrypt")):
+        crypto = commands.add_parser(name, help=description)
+        crypto.add_argument('paths', metavar='PLIK', help="ścieżka do pliku PNG")
+        crypto.add_argument('passphrase', metavar='HASŁO')
+        crypto.add_argument('-o', '--output', default=output, metavar='PLIK',
+                            help=f"plik wynikowy (domyślnie {output})")
+        crypto.add_argument('--threads', type=int, default=None, help="liczba procesów szyfrowania")
+        if name == 'encrypt':
+            crypto.add_argument('--mode', default='cbc', help="tryb szyfru blokowego: cbc lub ecb (domyślnie cbc)")
+
+    benchmark = commands.add_parser('crypto-benchmark',
+                                    help="zmierz przepustowość szyfrowania (MB/s) i sprawdź odszyfrowanie")
+    benchmark.add_argument('paths', nargs='*', metavar='PLIK', help="pliki do testu (domyślnie test/*.png)")
+    benchmark.add_argument('--threads', type=int, default=None, help="liczba procesów szyfrowania")
+
+    serve = commands.add_parser('serve', help="uruchom lokalną usługę HTTP z pulą procesów roboczych")
+    serve.add_argument('--host', default='127.0.0.1', help="adres nasłuchiwania (domyślnie 127.0.0.1)")
+    serve.add_argument('--port', type=int, default=8765, help="port nasłuchiwania (domyślnie 8765)")
+    serve.add_argument('--socket', metavar='ŚCIEŻKA', help="nasłuchuj na gnieździe Unix zamiast TCP")
+    serve.add_argument('--workers', type=int, default=None,
+                       help="liczba procesów roboczych (domyślnie liczba rdzeni)")
+    serve.add_argument('--queue-size', type=int, default=16,
+                       help="liczba zadań oczekujących, po której żądania są odrzucane (HTTP 503)")
+    serve.add_argument('--timeout', type=float, default=30.0, help="limit czasu zadania w sekundach")
+
+    return parser.parse_args(argv)
+
+
+def _make_cache(args):
+    return png_cache.PngCache(args.cache, args.cache_size) if args.cache else None
+
+
+def _anonymize_kwargs(args):
+    return dict(recompress=args.recompress, level=args.level, strategy=args.strategy,
+                workers=args.threads, compact_palette=args.compact_palette)
+
+
+def _start_profile(args):
+    if args.profile:
+        import tracemalloc
+        tracemalloc.start()
+
+
+def cmd_run(args):
+    import pipeline
+
+    file_path = args.paths or input("Podaj ścieżkę do pliku PNG: ")
+    cache = _make_cache(args)
+    _start_profile(args)
+
+    # 1. Wczytaj plik PNG raz - wszystkie etapy korzystają z tego samego obiektu
+    png = pipeline.PngPipeline(file_path, cache)
+    print("=== Sygnatura PNG poprawna ===")
+
+    # 2. Wyświetl informacje o chunkach (krytycznych i ancillary)
+    pipeline.run_info(png)
+
+    # 3. Oblicz i wyświetl FFT
+    pipeline.run_fft(png)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"\nPamięć podręczna: trafienia {stats['hits']}, chybienia {stats['misses']}")
+
+    # 4. Anonimizacja
+    pipeline.run_anonymize(png, 'anonymized.png', **_anonymize_kwargs(args))
+    if args.stages:
+        png.print_stages()
+    if args.profile:
+        png.print_profile()
+
+
+def cmd_info(args):
+    import pipeline
+
+    _start_profile(args)
+    png = pipeline.PngPipeline(args.paths)
+    print("=== Sygnatura PNG poprawna ===")
+    pipeline.run_info(png, additional_info=args.raw)
+    if args.profile:
+        png.print_profile()
+
+
+def cmd_fft(args):
+    import image_processor
+    import pipeline
+
+    _start_profile(args)
+    png = pipeline.PngPipeline(args.paths, _make_cache(args))
+    if args.save:
+        result = pipeline.run_fft(png, show=False, tile_size=args.tile_size, precision=args.precision)
+        with png.stage('save'):
+            image_processor.save_fft_spectra(result, args.save)
+        print(f"Widma FFT zapisano z prefiksem '{args.save}'")
+    else:
+        pipeline.run_fft(png, tile_size=args.tile_size, precision=args.precision)
+    if args.profile:
+        png.print_profile()
+
+
+def cmd_anonymize(args):
+    import png_handler
+
+    if args.paths == '-':
+        # Dane z potoku (standardowe wejście) - zawsze strumieniowo
+        with open(args.output, 'wb') as dst:
+            png_handler.anonymize_png_stream(sys.stdin.buffer, dst)
+        print(f"\nAnonimizacja zakończona. Zapisano jako '{args.output}'")
+    elif args.stream:
+        png_handler.anonymize_png_file(args.paths, args.output)
+    else:
+        import pipeline
+        _start_profile(args)
+        png = pipeline.PngPipeline(args.paths)
+        pipeline.run_anonymize(png, args.output, **_anonymize_kwargs(args))
+        if args.profile:
+            png.print_profile()
+        return
+    if args.profile:
+        print("Profil etapów dostępny jest tylko bez --stream i bez wejścia z potoku.")
+
+
+def cmd_filter(args):
+    import image_processor
+
+    image_processor.filter_png_file(args.paths, args.output, args.kind, workers=args.threads,
+                                    precision=args.precision, cutoff=args.cutoff, band=args.band,
+                                    notches=args.notch, notch_radius=args.notch_radius, order=args.order)
+    print(f"\nZapisano obraz po filtracji ({args.kind}) jako '{args.output}'")
+
+
+def cmd_frames(args):
+    import png_apng
+    from ancillary import BLEND_OPS, DISPOSE_OPS
+
+    image = png_apng.ApngImage.from_file(args.paths)
+    plays = image.num_plays or "bez końca"
+    print(f"Animacja APNG: {len(image)} ramek, odtworzenia: {plays}")
+    for frame in image.frames:
+        control = frame.control
+        source = "IDAT" if frame.is_default_image else "fdAT"
+        print(f"  {frame.index:4}  sekw. {control.sequence_number:4}  {control.width}x{control.height} "
+              f"+{control.x_offset}+{control.y_offset}  {control.delay:.3f} s  "
+              f"dispose={DISPOSE_OPS[control.dispose_op]}  blend={BLEND_OPS[control.blend_op]}"
+              f"  ({source}, chunków: {len(frame.data_chunks)})")
+
+    if args.save:
+        import image_processor
+
+        bit_depth = 16 if image.ihdr_info['bit_depth'] == 16 else 8
+        for frame, rgba in image.iter_frames():
+            path = f"{args.save}_{frame.index:04d}.png"
+            image_processor.save_channels_png(rgba[..., :3].transpose(2, 0, 1), path, bit_depth,
+                                              alpha=rgba[..., 3], workers=args.threads)
+        print(f"Ramki zapisano z prefiksem '{args.save}'")
+
+    if args.fft:
+        print("\n=== Widma FFT ramek ===")
+        for frame, result in png_apng.iter_frame_spectra(image, workers=args.threads):
+            magnitude = result['magnitude']
+            print(f"  {frame.index:4}  amplituda: średnia {magnitude.mean():8.2f}  maks. {magnitude.max():8.2f}")
+
+
+def cmd_verify(args):
+    import batch
+    import png_verify
+
+    failed = 0
+    for report in png_verify.verify_paths(batch.expand_inputs(args.paths), args.adler, args.workers):
+        png_verify.print_verify_report(report)
+        failed += not report['ok']
+    if failed:
+        sys.exit(1)
+
+
+def cmd_batch(args):
+    import batch
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        processed, failed = batch.run_batch(args.paths, output, args.workers, args.chunksize, args.verify)
+    finally:
+        if args.output:
+            output.close()
+    print(f"Przetworzono plików: {processed}, z błędami: {failed}", file=sys.stderr)
+
+
+def cmd_crypto(args):
+    import png_crypto
+    import png_handler
+
+    chunks = png_handler.read_png_file(args.paths, use_mmap=True)
+    if args.command == 'encrypt':
+        png_crypto.encrypt_png(chunks, args.output, args.passphrase, args.mode, workers=args.threads)
+        print(f"\nZaszyfrowano dane obrazu (XTEA, tryb {args.mode.upper()}). Zapisano jako '{args.output}'")
     else:
-        file_path = input("Podaj ścieżkę do pliku PNG: ")
+        png_crypto.decrypt_png(chunks, args.output, args.passphrase, workers=args.threads)
+        print(f"\nOdszyfrowano dane obrazu. Zapisano jako '{args.output}'")
+
+
+def cmd_crypto_benchmark(args):
+    import batch
+    import png_crypto
 
+    paths = list(batch.expand_inputs(args.paths or ['test/*.png']))
+    results = png_crypto.benchmark_crypto(paths, workers=args.threads)
+    if not all(result['round_trip'] for result in results):
+        sys.exit(1)
+
+
+def cmd_serve(args):
+    import asyncio
+    import service
+
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.socket, args.workers, args.queue_size, args.timeout))
+    except KeyboardInterrupt:
+        print("\nUsługa zatrzymana.")
+
+
+HANDLERS = {
+    'run': cmd_run,
+    'info': cmd_info,
+    'fft': cmd_fft,
+    'anonymize': cmd_anonymize,
+    'filter': cmd_filter,
+    'frames': cmd_frames,
+    'verify': cmd_verify,
+    'batch': cmd_batch,
+    'encrypt': cmd_crypto,
+    'decrypt': cmd_crypto,
+    'crypto-benchmark': cmd_crypto_benchmark,
+    'serve': cmd_serve,
+}
+
+
+def main(argv=None):
+    """Główna funkcja programu."""
+    args = parse_args(argv)
     try:
-        # 1. Wczytaj i przeanalizuj plik PNG
-        chunks = png_handler.read_png_file(file_path)
-
-        # 2. Wyświetl informacje o chunkach
-        print("\n=== Znalezione chunki ===")
-        print(", ".join([chunk['type'] for chunk in chunks]))
-        ihdr_info = png_handler.print_critical_chunks_info(chunks, False)
-        
-        # Wyświetlanie informacji z chunków ancillary
-        png_handler.print_ancillary_chunks_info(chunks, ihdr_info['color_type'], ihdr_info['bit_depth']) 
-
-        # 3. Oblicz i wyświetl FFT
-        image_processor.compute_and_show_fft_from_file(file_path)
-
-        # 4. Anonimizacja
-        output_path = 'anonymized.png'
-        png_handler.anonymize_png(chunks, output_path)
-
-    except FileNotFoundError:
-        print(f"Błąd: Plik '{file_path}' nie został znaleziony.")
+        HANDLERS[args.command](args)
+    except FileNotFoundError as e:
+        print(f"Błąd: Plik '{e.filename}' nie został znaleziony.")
     except ValueError as e:
         print(f"Błąd przetwarzania pliku PNG: {e}")
     except Exception as e:
         print(f"Wystąpił nieoczekiwany błąd: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,189 @@
+import time
+import tracemalloc
+import zlib
+from contextlib import contextmanager
+
+import png_handler
+from utils import parse_ihdr_chunk
+
+# Moduły zależne od NumPy (png_decoder, png_cache, png_palette, image_processor)
+# importowane są w metodach - etap info dla obrazów niepaletowych ich nie potrzebuje
+
+
+class PngPipeline:
+    """
+    Plik PNG wczytany jeden raz i współdzielony przez wszystkie etapy (info, FFT, paleta,
+    anonimizacja): indeks chunków (mmap), sparsowany IHDR oraz leniwie dekodowane piksele
+    i obraz w skali szarości. Każdy etap zapisuje w `stages`, z czego korzystał.
+    """
+
+    def __init__(self, file_path, cache=None):
+        self.file_path = file_path
+        self.cache = cache
+        self.stages = []
+        self._pixels = None
+        self._gray = None
+        self._palette = None
+        self._current = None
+        with self.stage('parse') as record:
+            self.chunks = png_handler.map_png_file(file_path)
+            if not self.chunks or self.chunks[0].type != 'IHDR':
+                raise ValueError("Brakuje chunka IHDR – plik PNG jest nieprawidłowy.")
+            self.ihdr_info = parse_ihdr_chunk(self.chunks[0]['data'])
+            # Sygnatura, nagłówki wszystkich chunków i dane IHDR
+            record['bytes_read'] = 8 + 12 * len(self.chunks) + self.chunks[0].length
+
+    def _use(self, resource):
+        if self._current is not None:
+            self._current['consumed'].add(resource)
+
+    @property
+    def idat_bytes(self):
+        return sum(chunk.length for chunk in self.chunks if chunk.type == 'IDAT')
+
+    @property
+    def pixels(self):
+        """Zdekodowane piksele - dekodowane przy pierwszym użyciu, potem współdzielone."""
+        self._use('pixels')
+        if self._pixels is None:
+            import png_decoder
+            self._pixels = png_decoder.decode_chunks(self.chunks)
+            if self._current is not None:
+                self._current['decoded'] = True
+                self._current['bytes_read'] += self.idat_bytes
+        return self._pixels
+
+    @property
+    def palette(self):
+        self._use('palette')
+        if self._palette is None:
+            import png_decoder
+            self._palette = png_decoder.find_palette(self.chunks)
+        return self._palette
+
+    @property
+    def gray(self):
+        """Obraz w skali szarości (z pamięci podręcznej, jeśli ją podano)."""
+        self._use('gray')
+        if self._gray is None:
+            import png_cache
+            import png_decoder
+
+            def convert():
+                return png_decoder.to_grayscale(self.pixels, self.ihdr_info, self.palette)
+            if self.cache is not None:
+                self._gray = self.cache.get_or_compute(png_cache.cache_key(self.chunks), 'gray', convert,
+                                                        self.chunks)
+            else:
+                self._gray = convert()
+        return self._gray
+
+    def chunk_bytes(self, include_idat=False):
+        """Łączna długość danych chunków (bez IDAT, chyba że include_idat=True)."""
+        return sum(chunk.length for chunk in self.chunks if include_idat or chunk.type != 'IDAT')
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Rejestruje czas etapu, przeczytane bajty i zasoby, z których skorzystał.
+        Gdy działa tracemalloc, zapisywany jest też szczyt zużycia pamięci w etapie.
+        """
+        record = {'stage': name, 'consumed': set(), 'decoded': False, 'bytes_read': 0, 'seconds': 0.0,
+                  'peak_bytes': None}
+        previous, self._current = self._current, record
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if tracing:
+                record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            self._current = previous
+            self.stages.append(record)
+
+    def print_stages(self):
+        print("\n=== Etapy przetwarzania ===")
+        for record in self.stages:
+            consumed = ", ".join(sorted(record['consumed'])) or "tylko chunki"
+            print(f"  {record['stage']:10} {record['seconds']:8.3f} s | dane: {consumed}"
+                  f"{' | dekodowanie IDAT' if record['decoded'] else ''}")
+
+    def print_profile(self):
+        """Tabela etapów: czas, przeczytane bajty i szczyt pamięci (tracemalloc)."""
+        print("\n=== Profil etapów ===")
+        print(f"  {'etap':10} {'czas [s]':>10} {'odczyt [MiB]':>13} {'szczyt pamięci [MiB]':>21}")
+        for record in self.stages:
+            peak = record['peak_bytes']
+            peak_text = f"{peak / 2 ** 20:21.2f}" if peak is not None else f"{'-':>21}"
+            print(f"  {record['stage']:10} {record['seconds']:10.3f} {record['bytes_read'] / 2 ** 20:13.2f} {peak_text}")
+        total = sum(record['seconds'] for record in self.stages)
+        print(f"  {'razem':10} {total:10.3f}")
+
+
+def run_info(pipeline, additional_info=False):
+    """Etap info: lista chunków, chunki krytyczne (z użyciem palety) i dodatkowe."""
+    with pipeline.stage('info') as record:
+        chunks = pipeline.chunks
+        record['bytes_read'] += pipeline.chunk_bytes()
+        print("\n=== Znalezione chunki ===")
+        print(", ".join([chunk.type for chunk in chunks]))
+        pixels = None
+        if pipeline.ihdr_info['color_type'] == 3:
+            # Uszkodzone dane IDAT nie przerywają etapu - użycie palety zostanie pominięte
+            try:
+                pixels = pipeline.pixels
+            except (ValueError, zlib.error):
+                pixels = None
+        ihdr_info = png_handler.print_critical_chunks_info(chunks, additional_info, pixels)
+        png_handler.print_ancillary_chunks_info(chunks, ihdr_info['color_type'], ihdr_info['bit_depth'])
+        return ihdr_info
+
+
+def run_palette(pipeline):
+    """Etap palety: histogram użycia wpisów palety (None dla obrazów bez palety)."""
+    with pipeline.stage('palette'):
+        palette = pipeline.palette
+        if pipeline.ihdr_info['color_type'] != 3 or palette is None:
+            return None
+        import png_palette
+        return png_palette.palette_usage(pipeline.pixels, len(palette))
+
+
+def run_fft(pipeline, show=True, tile_size=None, precision='float64'):
+    """
+    Etap FFT na współdzielonym obrazie w skali szarości; z tile_size - widmo Welcha
+    liczone kafelkami z pliku. Bez wyświetlania zwraca słownik widm.
+    """
+    import image_processor
+
+    with pipeline.stage('fft'):
+        if show:
+            # Jak w compute_and_show_fft_from_file: błąd dekodowania przerywa tylko etap FFT
+            try:
+                gray = None if tile_size else pipeline.gray
+            except Exception as e:
+                print(f"Błąd podczas obliczania FFT: {e}")
+                return None
+            image_processor.compute_and_show_fft_from_file(pipeline.file_path, pipeline.chunks, tile_size,
+                                                           pipeline.cache, gray, precision)
+            return None
+        if tile_size:
+            return image_processor.compute_welch_spectrum(pipeline.file_path, tile_size, chunks=pipeline.chunks,
+                                                          precision=precision)
+        return image_processor.compute_fft_from_file(pipeline.file_path, pipeline.chunks, precision,
+                                                     cache=pipeline.cache, gray_img=pipeline.gray)
+
+
+def run_anonymize(pipeline, output_path, **options):
+    """Etap anonimizacji; przy ponownej kompresji wykorzystuje już zdekodowane piksele."""
+    with pipeline.stage('anonymize') as record:
+        ihdr_info = pipeline.ihdr_info
+        needs_pixels = options.get('recompress') or (options.get('compact_palette') and ihdr_info['color_type'] == 3)
+        pixels = pipeline.pixels if needs_pixels else None
+        if not needs_pixels:
+            # Dane IDAT kopiowane są bez dekodowania
+            record['bytes_read'] += pipeline.idat_bytes
+        png_handler.anonymize_png(pipeline.chunks, output_path, pixels=pixels, **options)
@@ -0,0 +1,233 @@
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+import png_decoder
+import png_handler
+from ancillary import parse_animation_control, parse_frame_control
+from utils import parse_ihdr_chunk
+
+DISPOSE_NONE, DISPOSE_BACKGROUND, DISPOSE_PREVIOUS = 0, 1, 2
+BLEND_SOURCE, BLEND_OVER = 0, 1
+
+# Liczba ramek transformowanych jednym wywołaniem FFT (stos ramek)
+FFT_BATCH_SIZE = 8
+
+
+def is_apng(chunks):
+    return any(chunk['type'] == 'acTL' for chunk in chunks)
+
+
+class ApngFrame:
+    """
+    Ramka animacji z indeksu: dane fcTL oraz chunki z jej danymi (IDAT dla ramki
+    będącej obrazem domyślnym albo fdAT). Piksele nie są dekodowane przy indeksowaniu.
+    """
+    __slots__ = ('index', 'control', 'data_chunks', 'is_default_image')
+
+    def __init__(self, index, control, is_default_image):
+        self.index = index
+        self.control = control
+        self.data_chunks = []
+        self.is_default_image = is_default_image
+
+    def iter_data(self):
+        """Skompresowane dane ramki (dla fdAT bez 4-bajtowego numeru sekwencji)."""
+        for chunk in self.data_chunks:
+            data = png_handler.chunk_payload(chunk)
+            yield data if chunk['type'] == 'IDAT' else data[4:]
+
+    def covers(self, width, height):
+        control = self.control
+        return (control.x_offset == 0 and control.y_offset == 0
+                and control.width == width and control.height == height)
+
+    def __repr__(self):
+        control = self.control
+        return (f"ApngFrame(index={self.index}, size={control.width}x{control.height}, "
+                f"offset=({control.x_offset}, {control.y_offset}), delay={control.delay:.3f})")
+
+
+def index_frames(chunks):
+    """
+    Buduje indeks ramek APNG z listy chunków. Numery sekwencji fcTL i fdAT muszą
+    tworzyć ciąg 0, 1, 2, ... w kolejności występowania w pliku.
+    Zwraca (rekord acTL, lista ApngFrame).
+    """
+    ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+    animation = None
+    frames = []
+    sequence = 0
+    seen_idat = False
+    idat_done = False
+
+    for chunk in chunks:
+        chunk_type = chunk['type']
+        if chunk_type == 'acTL':
+            if seen_idat:
+                raise ValueError("Chunk acTL musi wystąpić przed IDAT")
+            animation = parse_animation_control(bytes(chunk['data']))
+        elif chunk_type == 'fcTL':
+            control = parse_frame_control(bytes(chunk['data']))
+            if control.sequence_number != sequence:
+                raise ValueError(f"Nieprawidłowy numer sekwencji fcTL: {control.sequence_number} "
+                                 f"(oczekiwano {sequence})")
+            sequence += 1
+            if (control.x_offset + control.width > ihdr_info['width']
+                    or control.y_offset + control.height > ihdr_info['height']):
+                raise ValueError(f"Ramka {len(frames)} wykracza poza obszar obrazu")
+            frame = ApngFrame(len(frames), control, is_default_image=not seen_idat)
+            if frame.is_default_image and not frame.covers(ihdr_info['width'], ihdr_info['height']):
+                raise ValueError("Ramka z obrazu domyślnego musi mieć rozmiar obrazu i zerowe przesunięcie")
+            frames.append(frame)
+        elif chunk_type == 'IDAT':
+            if idat_done:
+                raise ValueError("Chunki IDAT muszą występować po kolei")
+            seen_idat = True
+            if frames and frames[-1].is_default_image:
+                frames[-1].data_chunks.append(chunk)
+        elif chunk_type == 'fdAT':
+            number = struct.unpack('>I', bytes(chunk['data'][:4]))[0]
+            if number != sequence:
+                raise ValueError(f"Nieprawidłowy numer sekwencji fdAT: {number} (oczekiwano {sequence})")
+            sequence += 1
+            if not frames or frames[-1].is_default_image:
+                raise ValueError("Chunk fdAT bez poprzedzającego fcTL")
+            frames[-1].data_chunks.append(chunk)
+        if seen_idat and chunk_type != 'IDAT':
+            idat_done = True
+
+    if animation is None:
+        raise ValueError("Plik nie jest animacją APNG (brak chunka acTL)")
+    if len(frames) != animation.num_frames:
+        raise ValueError(f"acTL deklaruje {animation.num_frames} ramek, znaleziono {len(frames)}")
+    for frame in frames:
+        if not frame.data_chunks:
+            raise ValueError(f"Ramka {frame.index} nie ma danych obrazu")
+    return animation, frames
+
+
+def _blend_over(region, source, maximum):
+    """Nakładanie ramki (blend_op OVER): kompozycja alfa źródła na zawartość obszaru."""
+    source_alpha = source[..., 3:].astype(np.float32) / maximum
+    region_alpha = region[..., 3:].astype(np.float32) / maximum
+    out_alpha = source_alpha + region_alpha * (1 - source_alpha)
+    color = source[..., :3] * source_alpha + region[..., :3] * (region_alpha * (1 - source_alpha))
+    color /= np.where(out_alpha > 0, out_alpha, 1)
+    region[..., :3] = np.rint(color)
+    region[..., 3:] = np.rint(out_alpha * maximum)
+
+
+class ApngImage:
+    """
+    Animacja APNG nad indeksem chunków (np. z png_handler.map_png_file).
+    Ramki dekodowane są dopiero przy odczycie; iter_frames przechowuje tylko bieżące
+    płótno (RGBA) i kopię obszaru dla dispose_op PREVIOUS.
+    """
+
+    def __init__(self, chunks):
+        if not chunks or chunks[0]['type'] != 'IHDR':
+            raise ValueError("Brakuje chunka IHDR – plik PNG jest nieprawidłowy.")
+        self.chunks = chunks
+        self.ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+        self.animation, self.frames = index_frames(chunks)
+        self.palette = png_decoder.find_palette(chunks)
+        self.transparency = png_decoder.find_transparency(chunks)
+        self.dtype = np.uint16 if self.ihdr_info['bit_depth'] == 16 else np.uint8
+
+    @classmethod
+    def from_file(cls, file_path):
+        return cls(png_handler.map_png_file(file_path))
+
+    @property
+    def num_plays(self):
+        return self.animation.num_plays
+
+    def __len__(self):
+        return len(self.frames)
+
+    def decode_region(self, index):
+        """Piksele samej ramki (bez kompozycji) jako RGBA (wysokość ramki, szerokość ramki, 4)."""
+        frame = self.frames[index]
+        frame_info = dict(self.ihdr_info, width=frame.control.width, height=frame.control.height)
+        pixels = png_decoder.decode_idat(frame.iter_data(), frame_info)
+        return png_decoder.to_rgba(pixels, frame_info, self.palette, self.transparency)
+
+    def _start_index(self, index):
+        # Najbliższa wcześniejsza ramka, od której płótno nie zależy od poprzednich ramek
+        width, height = self.ihdr_info['width'], self.ihdr_info['height']
+        for start in range(index, 0, -1):
+            frame = self.frames[start]
+            if frame.control.blend_op == BLEND_SOURCE and frame.covers(width, height):
+                return start
+            previous = self.frames[start - 1]
+            if previous.control.dispose_op == DISPOSE_BACKGROUND and previous.covers(width, height):
+                return start
+        return 0
+
+    def iter_frames(self, start=0, stop=None):
+        """
+        Generator (ramka, obraz RGBA całego płótna) z zastosowaniem operacji blend/dispose.
+        Każdy zwracany obraz jest osobną kopią - w pamięci jest najwyżej jedna ramka naraz.
+        """
+        stop = len(self.frames) if stop is None else stop
+        maximum = np.iinfo(self.dtype).max
+        canvas = np.zeros((self.ihdr_info['height'], self.ihdr_info['width'], 4), dtype=self.dtype)
+        for frame in self.frames[self._start_index(start):stop]:
+            control = frame.control
+            region = canvas[control.y_offset:control.y_offset + control.height,
+                            control.x_offset:control.x_offset + control.width]
+            saved = region.copy() if control.dispose_op == DISPOSE_PREVIOUS else None
+            source = self.decode_region(frame.index)
+            if control.blend_op == BLEND_SOURCE:
+                region[...] = source
+            else:
+                _blend_over(region, source, maximum)
+            if frame.index >= start:
+                yield frame, canvas.copy()
+            if control.dispose_op == DISPOSE_BACKGROUND:
+                region[...] = 0
+            elif saved is not None:
+                region[...] = saved
+
+    def frame(self, index):
+        """Pojedyncza ramka (RGBA) - kompozycja od najbliższej niezależnej ramki."""
+        if not -len(self.frames) <= index < len(self.frames):
+            raise IndexError(f"Brak ramki {index} (animacja ma {len(self.frames)} ramek)")
+        index %= len(self.frames)
+        return next(self.iter_frames(index, index + 1))[1]
+
+
+def iter_frame_spectra(image, workers=None, batch_size=FFT_BATCH_SIZE, precision='float32'):
+    """
+    Widma FFT kolejnych ramek (w skali szarości). Ramki grupowane są w stosy po batch_size
+    i transformowane jednym wywołaniem compute_fft_spectra w puli wątków; w locie jest
+    najwyżej workers stosów, więc cała animacja nie trafia naraz do pamięci.
+    Zwraca generator (ramka, wynik compute_fft_spectra dla tej ramki) w kolejności ramek.
+    """
+    import image_processor
+
+    workers = workers or os.cpu_count() or 1
+    rgba_info = {'color_type': 6, 'bit_depth': 16 if image.dtype == np.uint16 else 8}
+
+    def spectra(frames, stack):
+        result = image_processor.compute_fft_spectra(np.stack(stack), precision=precision)
+        return [(frame, {name: values[i] for name, values in result.items()}) for i, frame in enumerate(frames)]
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        frames, stack = [], []
+        for frame, rgba in image.iter_frames():
+            frames.append(frame)
+            stack.append(png_decoder.to_grayscale(rgba, rgba_info))
+            if len(stack) == batch_size:
+                pending.append(executor.submit(spectra, frames, stack))
+                frames, stack = [], []
+                if len(pending) >= workers:
+                    yield from pending.popleft().result()
+        if stack:
+            pending.append(executor.submit(spectra, frames, stack))
+        while pending:
+            yield from pending.popleft().result()
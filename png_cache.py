@@ -0,0 +1,163 @@
+import hashlib
+import os
+import struct
+import tempfile
+
+from png_handler import chunk_payload
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'emedia')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+# Chunki, od których zależy zdekodowany obraz (obok IHDR i strumienia IDAT)
+KEY_CHUNK_TYPES = ('IHDR', 'PLTE', 'tRNS')
+
+
+def cache_key(chunks, full_hash=False):
+    """
+    Klucz obrazu na podstawie IHDR, PLTE, tRNS i strumienia IDAT.
+    Domyślnie z IDAT haszowane są tylko długości i CRC chunków (bez czytania danych) -
+    to szybki klucz wstępny; full_hash=True haszuje pełne dane IDAT (potwierdzenie trafienia).
+    """
+    digest = hashlib.sha256()
+    found_ihdr = False
+    for chunk in chunks:
+        if chunk['type'] in KEY_CHUNK_TYPES:
+            digest.update(chunk['type'].encode('ascii'))
+            digest.update(struct.pack('>I', chunk['length']))
+            digest.update(chunk_payload(chunk))
+            found_ihdr = found_ihdr or chunk['type'] == 'IHDR'
+        elif chunk['type'] == 'IDAT':
+            digest.update(struct.pack('>I', chunk['length']))
+            digest.update(chunk['crc'])
+            if full_hash:
+                digest.update(chunk_payload(chunk))
+    if not found_ihdr:
+        raise ValueError("Brakuje chunka IHDR – plik PNG jest nieprawidłowy.")
+    return digest.hexdigest()
+
+
+class PngCache:
+    """
+    Dyskowa pamięć podręczna tablic (zdekodowane piksele, widma FFT) adresowana treścią.
+    Tablice zapisywane są jako pliki .npy i przy odczycie mapowane do pamięci.
+    Rozmiar ograniczony jest przez max_bytes - najdawniej używane wpisy są usuwane (LRU).
+    Z podanymi chunkami obok tablicy zapisywany jest pełny hasz treści (plik .sha256),
+    a trafienie po szybkim kluczu jest potwierdzane porównaniem tego hasza.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._content_hashes = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key, name, extension='.npy'):
+        return os.path.join(self.cache_dir, f"{key}_{name}{extension}")
+
+    def _content_hash(self, key, chunks):
+        # Pełny hasz liczony raz dla danego indeksu chunków (kilka tablic tego samego obrazu)
+        known = self._content_hashes.get(key)
+        if known is not None and known[0] is chunks:
+            return known[1]
+        digest = cache_key(chunks, full_hash=True)
+        self._content_hashes[key] = (chunks, digest)
+        return digest
+
+    def _confirmed(self, key, name, chunks):
+        try:
+            with open(self._path(key, name, '.sha256'), encoding='ascii') as f:
+                stored = f.read().strip()
+        except OSError:
+            return False
+        return stored == self._content_hash(key, chunks)
+
+    def load(self, key, name, chunks=None):
+        """
+        Zwraca zmapowaną tablicę albo None, jeśli wpisu nie ma. Z podanymi chunkami
+        wpis, którego hasz treści się nie zgadza (kolizja szybkiego klucza), jest chybieniem.
+        """
+        import numpy as np
+
+        path = self._path(key, name)
+        try:
+            array = np.load(path, mmap_mode='r')
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+        if chunks is not None and not self._confirmed(key, name, chunks):
+            self.misses += 1
+            return None
+        # Czas modyfikacji służy jako znacznik ostatniego użycia dla LRU
+        os.utime(path)
+        self.hits += 1
+        return array
+
+    def _write_atomic(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def store(self, key, name, array, chunks=None):
+        """
+        Zapisuje tablicę atomowo (plik tymczasowy + os.replace) i pilnuje limitu rozmiaru.
+        Z podanymi chunkami zapisywany jest też hasz treści do potwierdzania trafień.
+        """
+        import numpy as np
+
+        if chunks is not None:
+            digest = self._content_hash(key, chunks).encode('ascii')
+            self._write_atomic(self._path(key, name, '.sha256'), lambda f: f.write(digest))
+        self._write_atomic(self._path(key, name), lambda f: np.save(f, np.asarray(array)))
+        self.evict()
+
+    def get_or_compute(self, key, name, compute, chunks=None):
+        """Zwraca tablicę z pamięci podręcznej lub oblicza ją funkcją compute() i zapisuje."""
+        array = self.load(key, name, chunks)
+        if array is None:
+            array = compute()
+            self.store(key, name, array, chunks)
+        return array
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.npy'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Usuwa najdawniej używane wpisy, dopóki rozmiar przekracza max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for entry_path in (path, path[:-len('.npy')] + '.sha256'):
+                try:
+                    os.remove(entry_path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def clear(self):
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(('.npy', '.sha256')):
+                    os.remove(entry.path)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self.size(), 'max_bytes': self.max_bytes}
@@ -0,0 +1,371 @@
+import hashlib
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import png_decoder
+import png_encoder
+import png_handler
+from utils import parse_ihdr_chunk
+
+# Szyfr blokowy XTEA: blok 64 bity, klucz 128 bitów, 32 cykle (64 rundy Feistela)
+BLOCK_SIZE = 8
+XTEA_CYCLES = 32
+XTEA_DELTA = 0x9E3779B9
+MASK32 = 0xFFFFFFFF
+
+MODES = ('ecb', 'cbc')
+
+# Prywatny chunk z parametrami szyfrowania: c - dodatkowy, r - prywatny, Y - zarezerwowany,
+# P - niebezpieczny do kopiowania (zależy od danych obrazu)
+CRYPTO_CHUNK_TYPE = 'crYP'
+CRYPTO_ALGORITHM = b'XTEA'
+
+# Wyprowadzanie klucza z hasła: PBKDF2-HMAC-SHA256 z losową solą zapisaną w chunku crYP
+KDF_SALT_SIZE = 16
+KDF_ITERATIONS = 200_000
+
+# Poniżej tej liczby bloków narzut puli procesów przewyższa zysk
+PARALLEL_MIN_BLOCKS = 256 * 1024
+
+# CBC: dane dzielone są na łańcuchy o tej długości (każdy z własnym IV wyprowadzonym
+# z IV pliku), szyfrowane wektorowo - krok po kroku wszystkie łańcuchy partii naraz
+CBC_SEGMENT_SIZE = 256
+CBC_BATCH_SIZE = 1024 * 1024
+
+
+def key_from_passphrase(passphrase, salt, iterations=KDF_ITERATIONS):
+    """128-bitowy klucz XTEA (4 słowa 32-bitowe) wyprowadzony z hasła i soli przez PBKDF2-HMAC-SHA256."""
+    if isinstance(passphrase, str):
+        passphrase = passphrase.encode('utf-8')
+    return struct.unpack('>4I', hashlib.pbkdf2_hmac('sha256', passphrase, salt, iterations, dklen=16))
+
+
+def _round_keys(key):
+    """Klucze rund (sum + key[...]) dla obu połówek każdego cyklu."""
+    first, second = [], []
+    total = 0
+    for _ in range(XTEA_CYCLES):
+        first.append((total + key[total & 3]) & MASK32)
+        total = (total + XTEA_DELTA) & MASK32
+        second.append((total + key[(total >> 11) & 3]) & MASK32)
+    return first, second
+
+
+def xtea_encrypt_blocks(blocks, key):
+    """Szyfruje wektorowo tablicę bloków (n, 2) uint32 - wszystkie bloki naraz."""
+    v0 = blocks[:, 0].copy()
+    v1 = blocks[:, 1].copy()
+    first, second = _round_keys(key)
+    for k0, k1 in zip(first, second):
+        v0 += (((v1 << 4) ^ (v1 >> 5)) + v1) ^ np.uint32(k0)
+        v1 += (((v0 << 4) ^ (v0 >> 5)) + v0) ^ np.uint32(k1)
+    return np.stack((v0, v1), axis=1)
+
+
+def xtea_decrypt_blocks(blocks, key):
+    """Deszyfruje wektorowo tablicę bloków (n, 2) uint32."""
+    v0 = blocks[:, 0].copy()
+    v1 = blocks[:, 1].copy()
+    first, second = _round_keys(key)
+    for k0, k1 in zip(reversed(first), reversed(second)):
+        v1 -= (((v0 << 4) ^ (v0 >> 5)) + v0) ^ np.uint32(k1)
+        v0 -= (((v1 << 4) ^ (v1 >> 5)) + v1) ^ np.uint32(k0)
+    return np.stack((v0, v1), axis=1)
+
+
+def _to_blocks(data):
+    return np.frombuffer(data, dtype='>u4').astype(np.uint32).reshape(-1, 2)
+
+
+def _from_blocks(blocks):
+    return blocks.astype('>u4').tobytes()
+
+
+def _process_blocks(blocks, key, decrypt, workers):
+    """Przetwarza niezależne bloki (ECB, deszyfrowanie CBC) - dla dużych danych w puli procesów."""
+    function = xtea_decrypt_blocks if decrypt else xtea_encrypt_blocks
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(blocks) < PARALLEL_MIN_BLOCKS:
+        return function(blocks, key)
+    parts = np.array_split(blocks, workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return np.concatenate(list(executor.map(function, parts, [key] * len(parts))))
+
+
+def _tail_keystream(key, seed_block):
+    """Strumień klucza dla ostatnich (< 8) bajtów: zaszyfrowany blok seed_block."""
+    if seed_block is None:
+        raise ValueError("Szyfrowanie niepełnego bloku wymaga wektora IV")
+    return _from_blocks(xtea_encrypt_blocks(_to_blocks(seed_block), key))
+
+
+def _xor(data, keystream):
+    return bytes(a ^ b for a, b in zip(data, keystream))
+
+
+def _segment_ivs(key, iv, first_segment, count):
+    """IV kolejnych łańcuchów CBC: E(IV xor numer łańcucha)."""
+    base = _to_blocks(iv)[0]
+    index = np.arange(first_segment, first_segment + count, dtype=np.uint64)
+    ivs = np.empty((count, 2), dtype=np.uint32)
+    ivs[:, 0] = base[0] ^ (index >> np.uint64(32)).astype(np.uint32)
+    ivs[:, 1] = base[1] ^ (index & np.uint64(MASK32)).astype(np.uint32)
+    return xtea_encrypt_blocks(ivs, key)
+
+
+def _cbc_encrypt_chains(chains, ivs, key):
+    """Szyfruje łańcuchy (n, k, 2): k kroków, w każdym wektorowo bloki wszystkich n łańcuchów."""
+    out = np.empty_like(chains)
+    previous = ivs
+    for step in range(chains.shape[1]):
+        previous = xtea_encrypt_blocks(chains[:, step] ^ previous, key)
+        out[:, step] = previous
+    return out
+
+
+def iter_cbc_encrypt(pieces, key, iv):
+    """
+    Strumieniowe szyfrowanie CBC: przyjmuje fragmenty danych dowolnej długości
+    i zwraca fragmenty szyfrogramu (ta sama długość łącznie). Bloki są łańcuchowane
+    w obrębie łańcuchów po CBC_SEGMENT_SIZE bajtów, więc podział na łańcuchy nie zależy
+    od podziału wejścia; w pamięci jest najwyżej partia CBC_BATCH_SIZE bajtów.
+    """
+    chain_blocks = CBC_SEGMENT_SIZE // BLOCK_SIZE
+    segment = 0
+    last = _to_blocks(iv)[0]
+    pending = bytearray()
+
+    def encrypt(data):
+        nonlocal segment, last
+        blocks = _to_blocks(data)
+        count = len(blocks) // chain_blocks
+        parts = []
+        if count:
+            chains = blocks[:count * chain_blocks].reshape(count, chain_blocks, 2)
+            parts.append(_cbc_encrypt_chains(chains, _segment_ivs(key, iv, segment, count), key).reshape(-1, 2))
+            segment += count
+        rest = blocks[count * chain_blocks:]
+        if len(rest):
+            # Niepełny ostatni łańcuch (tylko na końcu danych)
+            parts.append(_cbc_encrypt_chains(rest[None], _segment_ivs(key, iv, segment, 1), key)[0])
+            segment += 1
+        out = np.concatenate(parts)
+        last = out[-1]
+        return _from_blocks(out)
+
+    for piece in pieces:
+        pending += piece
+        while len(pending) >= CBC_BATCH_SIZE:
+            yield encrypt(bytes(pending[:CBC_BATCH_SIZE]))
+            del pending[:CBC_BATCH_SIZE]
+    # Ostatnia partia: pełne łańcuchy, niepełny łańcuch i ewentualna końcówka (< 8 bajtów)
+    full = len(pending) - len(pending) % BLOCK_SIZE
+    if full:
+        yield encrypt(bytes(pending[:full]))
+    if full < len(pending):
+        yield _xor(pending[full:], _tail_keystream(key, _from_blocks(last[None])))
+
+
+def encrypt_bytes(data, key, mode='ecb', iv=None, workers=None):
+    """
+    Szyfruje dane w trybie ECB (bloki niezależne, wektorowo i równolegle) lub CBC (strumieniowo,
+    fragmentami po CBC_BATCH_SIZE bajtów). Długość szyfrogramu jest równa długości danych:
+    niepełny ostatni blok jest szyfrowany przez XOR ze strumieniem klucza - w ECB z
+    zaszyfrowanego IV (losowego dla każdego pliku), w CBC z ostatniego bloku szyfrogramu.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Nieznany tryb szyfrowania: {mode}")
+    if mode == 'cbc':
+        view = memoryview(data).cast('B')
+        pieces = (view[start:start + CBC_BATCH_SIZE] for start in range(0, len(view), CBC_BATCH_SIZE))
+        return b''.join(iter_cbc_encrypt(pieces, key, iv))
+
+    data = bytes(data)
+    full = len(data) - len(data) % BLOCK_SIZE
+    out = _from_blocks(_process_blocks(_to_blocks(data[:full]), key, False, workers))
+    if full < len(data):
+        out += _xor(data[full:], _tail_keystream(key, iv))
+    return out
+
+
+def decrypt_bytes(data, key, mode='ecb', iv=None, workers=None):
+    """Odwrotność encrypt_bytes; w obu trybach bloki deszyfrowane są wektorowo i równolegle."""
+    if mode not in MODES:
+        raise ValueError(f"Nieznany tryb szyfrowania: {mode}")
+    data = bytes(data)
+    full = len(data) - len(data) % BLOCK_SIZE
+    cipher_blocks = _to_blocks(data[:full])
+    blocks = _process_blocks(cipher_blocks, key, True, workers)
+
+    if mode == 'cbc':
+        # P[i] = D(C[i]) xor C[i-1] (pierwszy blok łańcucha: IV łańcucha) - zależy tylko od szyfrogramu
+        chain_blocks = CBC_SEGMENT_SIZE // BLOCK_SIZE
+        previous = np.concatenate((_to_blocks(iv), cipher_blocks[:-1])) if full else cipher_blocks
+        previous[::chain_blocks] = _segment_ivs(key, iv, 0, len(previous[::chain_blocks]))
+        blocks ^= previous
+        seed = data[full - BLOCK_SIZE:full] if full else iv
+    else:
+        seed = iv
+
+    out = _from_blocks(blocks)
+    if full < len(data):
+        out += _xor(data[full:], _tail_keystream(key, seed))
+    return out
+
+
+def _crypto_chunk_data(mode, iv, palette_entries, salt, iterations):
+    return (CRYPTO_ALGORITHM + b'\x00' + bytes((MODES.index(mode),)) + iv
+            + struct.pack('>H', palette_entries) + salt + struct.pack('>I', iterations))
+
+
+def _parse_crypto_chunk(data):
+    """Zwraca (tryb, IV, liczba wpisów palety, sól, liczba iteracji PBKDF2)."""
+    algorithm, _, rest = bytes(data).partition(b'\x00')
+    if algorithm != CRYPTO_ALGORITHM or len(rest) != 1 + BLOCK_SIZE + 2 + KDF_SALT_SIZE + 4 or rest[0] >= len(MODES):
+        raise ValueError("Nieprawidłowy chunk parametrów szyfrowania")
+    mode = MODES[rest[0]]
+    iv = rest[1:1 + BLOCK_SIZE]
+    palette_entries, = struct.unpack_from('>H', rest, 1 + BLOCK_SIZE)
+    salt = rest[3 + BLOCK_SIZE:3 + BLOCK_SIZE + KDF_SALT_SIZE]
+    iterations, = struct.unpack_from('>I', rest, 3 + BLOCK_SIZE + KDF_SALT_SIZE)
+    return mode, iv, palette_entries, salt, iterations
+
+
+def _split_ancillary(chunks):
+    """
+    Chunki dodatkowe (np. tRNS, gAMA, tEXt) przenoszone bez zmian przez szyfrowanie, jako
+    pary (typ, dane) w trzech grupach: przed PLTE, między PLTE a IDAT oraz po IDAT.
+    """
+    if any(chunk['type'] in png_handler.ANIMATION_CHUNK_TYPES for chunk in chunks):
+        raise ValueError("Szyfrowanie animacji APNG nie jest obsługiwane")
+    groups = ([], [], [])
+    position = 0
+    for chunk in chunks:
+        chunk_type = chunk['type']
+        if chunk_type == 'PLTE':
+            position = max(position, 1)
+        elif chunk_type == 'IDAT':
+            position = 2
+        elif chunk_type not in ('IHDR', 'IEND', CRYPTO_CHUNK_TYPE):
+            groups[position].append((chunk_type, png_handler.chunk_payload(chunk)))
+    return groups
+
+
+def encrypt_png(chunks, output_path, passphrase, mode='cbc', iv=None, workers=None, salt=None,
+                kdf_iterations=KDF_ITERATIONS):
+    """
+    Szyfruje dane obrazu, zachowując poprawny plik PNG: IHDR, PLTE i chunki dodatkowe
+    (m.in. tRNS) pozostają bez zmian, a IDAT zawiera zaszyfrowane piksele. Klucz
+    wyprowadzany jest z hasła i losowej soli; parametry (tryb, IV, sól, liczba iteracji)
+    zapisywane są w chunku crYP.
+    Paleta jest uzupełniana do 2^głębia wpisów, aby każdy zaszyfrowany indeks był poprawny.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Nieznany tryb szyfrowania: {mode}")
+    before_plte, before_idat, after_idat = _split_ancillary(chunks)
+    ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+    ihdr_info['interlace_method'] = 0
+    raw = png_encoder.pack_pixels(png_decoder.decode_chunks(chunks), ihdr_info)
+    iv = iv or os.urandom(BLOCK_SIZE)
+    salt = salt or os.urandom(KDF_SALT_SIZE)
+    key = key_from_passphrase(passphrase, salt, kdf_iterations)
+
+    cipher = encrypt_bytes(raw, key, mode, iv, workers)
+    cipher_raw = np.frombuffer(cipher, dtype=np.uint8).reshape(raw.shape)
+
+    palette = png_decoder.find_palette(chunks)
+    palette_entries = 0 if palette is None else len(palette)
+    output = [('IHDR', png_encoder.build_ihdr(ihdr_info['width'], ihdr_info['height'],
+                                              ihdr_info['bit_depth'], ihdr_info['color_type']))]
+    output += before_plte
+    if palette is not None:
+        padded = np.zeros((max(palette_entries, 1 << ihdr_info['bit_depth']) if ihdr_info['color_type'] == 3
+                           else palette_entries, 3), dtype=np.uint8)
+        padded[:palette_entries] = palette
+        output.append(('PLTE', padded.tobytes()))
+    output += before_idat
+    output.append((CRYPTO_CHUNK_TYPE, _crypto_chunk_data(mode, iv, palette_entries, salt, kdf_iterations)))
+    # Szyfrogram jest niekompresowalny - najszybsza kompresja, bez filtrów
+    output.append(('IDAT', png_encoder.encode_scanlines(cipher_raw, ihdr_info, 1, filter_mode=0, workers=workers)))
+    output += after_idat
+    output.append(('IEND', b''))
+    png_handler.write_png_chunks(output_path, output)
+
+
+def decrypt_png(chunks, output_path, passphrase, workers=None):
+    """Odszyfrowuje plik utworzony przez encrypt_png (z zachowaniem chunków dodatkowych)."""
+    crypto = next((chunk for chunk in chunks if chunk['type'] == CRYPTO_CHUNK_TYPE), None)
+    if crypto is None:
+        raise ValueError("Brak chunka crYP - plik nie został zaszyfrowany")
+    mode, iv, palette_entries, salt, iterations = _parse_crypto_chunk(crypto['data'])
+    key = key_from_passphrase(passphrase, salt, iterations)
+    before_plte, before_idat, after_idat = _split_ancillary(chunks)
+
+    ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+    cipher_raw = png_decoder.decode_raw_rows(png_decoder.iter_idat_data(chunks), ihdr_info)
+    plain = decrypt_bytes(cipher_raw.tobytes(), key, mode, iv, workers)
+    raw = np.frombuffer(plain, dtype=np.uint8).reshape(cipher_raw.shape)
+
+    output = [('IHDR', png_encoder.build_ihdr(ihdr_info['width'], ihdr_info['height'],
+                                              ihdr_info['bit_depth'], ihdr_info['color_type']))]
+    output += before_plte
+    palette = png_decoder.find_palette(chunks)
+    if palette is not None:
+        output.append(('PLTE', palette[:palette_entries].tobytes()))
+    output += before_idat
+    output.append(('IDAT', png_encoder.encode_scanlines(raw, ihdr_info, workers=workers)))
+    output += after_idat
+    output.append(('IEND', b''))
+    png_handler.write_png_chunks(output_path, output)
+
+
+def benchmark_crypto(paths, passphrase='emedia', modes=MODES, workers=None, scratch_dir=None):
+    """
+    Mierzy przepustowość (MB/s) szyfrowania i deszyfrowania danych obrazu oraz sprawdza,
+    czy odszyfrowany plik ma dokładnie te same piksele (i paletę) co oryginał.
+    Mierzony jest sam szyfr: klucz wyprowadzany jest z jedną iteracją PBKDF2, aby czas
+    wyprowadzania klucza nie zaniżał przepustowości małych plików.
+    Zwraca listę wyników i wypisuje je w tabeli.
+    """
+    import tempfile
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=scratch_dir) as tmp:
+        encrypted_path = os.path.join(tmp, 'encrypted.png')
+        decrypted_path = os.path.join(tmp, 'decrypted.png')
+        for path in paths:
+            chunks = png_handler.map_png_file(path)
+            ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+            original = png_decoder.decode_chunks(chunks)
+            size_mb = png_encoder.pack_pixels(original, dict(ihdr_info, interlace_method=0)).nbytes / 1e6
+            for mode in modes:
+                start = time.perf_counter()
+                encrypt_png(chunks, encrypted_path, passphrase, mode, workers=workers, kdf_iterations=1)
+                encrypt_time = time.perf_counter() - start
+
+                encrypted = png_handler.map_png_file(encrypted_path)
+                start = time.perf_counter()
+                decrypt_png(encrypted, decrypted_path, passphrase, workers=workers)
+                decrypt_time = time.perf_counter() - start
+
+                decrypted = png_handler.map_png_file(decrypted_path)
+                palette = png_decoder.find_palette(chunks)
+                round_trip = bool(np.array_equal(png_decoder.decode_chunks(decrypted), original)) and (
+                    palette is None or np.array_equal(png_decoder.find_palette(decrypted), palette)) and (
+                    png_decoder.find_transparency(decrypted) == png_decoder.find_transparency(chunks))
+                results.append({
+                    'path': path, 'mode': mode, 'megabytes': size_mb,
+                    'encrypt_mb_s': size_mb / encrypt_time, 'decrypt_mb_s': size_mb / decrypt_time,
+                    'round_trip': round_trip,
+                })
+                del encrypted, decrypted
+
+    print(f"{'Plik':40} {'Tryb':5} {'MB':>8} {'Szyfr. MB/s':>12} {'Deszyfr. MB/s':>14} {'Zgodność':>9}")
+    for r in results:
+        print(f"{os.path.basename(r['path']):40} {r['mode']:5} {r['megabytes']:8.2f} "
+              f"{r['encrypt_mb_s']:12.2f} {r['decrypt_mb_s']:14.2f} {'tak' if r['round_trip'] else 'NIE':>9}")
+    return results
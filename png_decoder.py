@@ -0,0 +1,549 @@
+import zlib
+from collections import deque
+import numpy as np
+
+import png_handler
+from utils import parse_ihdr_chunk
+
+# Liczba kanałów dla każdego typu koloru
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Dozwolone głębie bitowe dla typów koloru (specyfikacja PNG, tabela 11.1)
+ALLOWED_BIT_DEPTHS = {
+    0: (1, 2, 4, 8, 16),
+    2: (8, 16),
+    3: (1, 2, 4, 8),
+    4: (8, 16),
+    6: (8, 16),
+}
+
+# Przebiegi Adam7: (x początkowe, y początkowe, krok x, krok y)
+ADAM7_PASSES = (
+    (0, 0, 8, 8),
+    (4, 0, 8, 8),
+    (0, 4, 4, 8),
+    (2, 0, 4, 4),
+    (0, 2, 2, 4),
+    (1, 0, 2, 2),
+    (0, 1, 1, 2),
+)
+
+DECOMPRESS_CHUNK_SIZE = 256 * 1024
+
+# Wiersze odfiltrowywane są blokami: najwyżej UNFILTER_BLOCK_ROWS wierszy i ok. UNFILTER_BLOCK_BYTES danych
+UNFILTER_BLOCK_ROWS = 256
+UNFILTER_BLOCK_BYTES = 1024 * 1024
+
+# Fala po przekątnych opłaca się, gdy wiersze Average/Paeth mają łącznie co najmniej tyle
+# bajtów na każdy krok fali (krok to kilka operacji NumPy na całej przekątnej)
+WAVEFRONT_STEP_BYTES = 64
+
+# Wagi (lewy, górny) predyktora liniowego (wa * a + wb * b) >> 1 dla filtrów
+# None, Sub, Up i Average; Paeth liczony jest osobno
+_FILTER_WEIGHTS = np.array([[0, 0], [2, 0], [0, 2], [1, 1], [0, 0]], dtype=np.int16)
+
+
+def _image_layout(ihdr_info):
+    """Zwraca (liczba kanałów, bity na piksel, bajty na piksel dla filtrów)."""
+    color_type = ihdr_info['color_type']
+    bit_depth = ihdr_info['bit_depth']
+    if color_type not in CHANNELS:
+        raise ValueError(f"Nieobsługiwany typ koloru: {color_type}")
+    if bit_depth not in ALLOWED_BIT_DEPTHS[color_type]:
+        raise ValueError(f"Niedozwolona głębia bitowa {bit_depth} dla typu koloru {color_type}")
+    if ihdr_info['interlace_method'] not in (0, 1):
+        raise ValueError(f"Nieobsługiwana metoda przeplotu: {ihdr_info['interlace_method']}")
+    channels = CHANNELS[color_type]
+    bits_per_pixel = channels * bit_depth
+    return channels, bits_per_pixel, max(1, bits_per_pixel // 8)
+
+
+def _row_bytes(width, bits_per_pixel):
+    return (width * bits_per_pixel + 7) // 8
+
+
+def output_shape(ihdr_info):
+    """Kształt tablicy zwracanej przez decode_idat."""
+    channels = CHANNELS[ihdr_info['color_type']]
+    if channels == 1:
+        return (ihdr_info['height'], ihdr_info['width'])
+    return (ihdr_info['height'], ihdr_info['width'], channels)
+
+
+def output_dtype(ihdr_info):
+    return np.uint16 if ihdr_info['bit_depth'] == 16 else np.uint8
+
+
+def _pass_sizes(ihdr_info):
+    """Wymiary (szerokość, wysokość) kolejnych przebiegów (jeden przebieg bez przeplotu)."""
+    width, height = ihdr_info['width'], ihdr_info['height']
+    if ihdr_info['interlace_method'] == 0:
+        return [(width, height)]
+    return [((width - x0 + dx - 1) // dx, (height - y0 + dy - 1) // dy)
+            for x0, y0, dx, dy in ADAM7_PASSES]
+
+
+def unfilter_scanline(filter_type, line, prior, bpp):
+    """
+    Odwraca filtr pojedynczego wiersza.
+    line - przefiltrowane bajty wiersza (uint8), prior - zrekonstruowany poprzedni wiersz.
+    """
+    if filter_type == 0:
+        return line
+    if filter_type == 1:
+        # Sub: suma narastająca co bpp bajtów (arytmetyka modulo 256)
+        n = line.size
+        pad = (-n) % bpp
+        if pad:
+            line = np.concatenate((line, np.zeros(pad, dtype=np.uint8)))
+        recon = line.reshape(-1, bpp).cumsum(axis=0, dtype=np.uint8).ravel()
+        return recon[:n]
+    if filter_type == 2:
+        return line + prior
+    if filter_type == 3:
+        return _unfilter_average(line, prior, bpp)
+    if filter_type == 4:
+        return _unfilter_paeth(line, prior, bpp)
+    raise ValueError(f"Nieznany typ filtra wiersza: {filter_type}")
+
+
+def _unfilter_average(line, prior, bpp):
+    # Zależność od lewego sąsiada jest sekwencyjna, ale kanały (bajty co bpp)
+    # są niezależne - każdy przetwarzamy osobno z bieżącą wartością w zmiennej lokalnej
+    out = np.empty_like(line)
+    head = line[:bpp] + (prior[:bpp] >> 1)
+    first_row = not prior.any()
+    for channel in range(bpp):
+        filtered = line[channel::bpp].tolist()
+        left = int(head[channel])
+        values = [left]
+        append = values.append
+        if first_row:
+            for f in filtered[1:]:
+                left = (f + (left >> 1)) & 0xFF
+                append(left)
+        else:
+            for f, u in zip(filtered[1:], prior[channel + bpp::bpp].tolist()):
+                left = (f + ((left + u) >> 1)) & 0xFF
+                append(left)
+        out[channel::bpp] = values
+    return out
+
+
+def _unfilter_paeth(line, prior, bpp):
+    if not prior.any():
+        # Dla zerowego poprzedniego wiersza Paeth sprowadza się do filtra Sub
+        return unfilter_scanline(1, line, prior, bpp)
+
+    out = np.empty_like(line)
+    head = line[:bpp] + prior[:bpp]
+    up_int = prior.astype(np.int16)
+    for channel in range(bpp):
+        filtered = line[channel::bpp].tolist()
+        up_channel = up_int[channel::bpp]
+        # Składowe zależne tylko od poprzedniego wiersza liczone wektorowo
+        up = up_channel[1:].tolist()
+        up_left = up_channel[:-1].tolist()
+        dist_a = np.abs(up_channel[1:] - up_channel[:-1]).tolist()
+        diff_up = (up_channel[1:] - up_channel[:-1]).tolist()
+        a = int(head[channel])
+        values = [a]
+        append = values.append
+        for f, b, c, pa, bc in zip(filtered[1:], up, up_left, dist_a, diff_up):
+            pb = a - c
+            pc = bc + pb
+            pb = -pb if pb < 0 else pb
+            pc = -pc if pc < 0 else pc
+            if pa <= pb and pa <= pc:
+                a = (f + a) & 0xFF
+            elif pb <= pc:
+                a = (f + b) & 0xFF
+            else:
+                a = (f + c) & 0xFF
+            append(a)
+        out[channel::bpp] = values
+    return out
+
+
+def _unpack_scanline(recon, width, channels, bit_depth):
+    """Zamienia zrekonstruowane bajty wiersza (albo wierszy - ostatnia oś) na wartości pikseli."""
+    if bit_depth == 8:
+        values = recon
+    elif bit_depth == 16:
+        values = recon.view('>u2')
+    else:
+        # Głębie 1/2/4: kilka pikseli w bajcie, najstarsze bity pierwsze
+        shifts = np.arange(8 - bit_depth, -1, -bit_depth, dtype=np.uint8)
+        mask = (1 << bit_depth) - 1
+        values = ((recon[..., None] >> shifts) & mask).reshape(recon.shape[:-1] + (-1,))
+    values = values[..., :width * channels]
+    if channels == 1:
+        return values
+    return values.reshape(values.shape[:-1] + (width, channels))
+
+
+def _skewed(diagonals, rows, width):
+    """Widok (wiersz, piksel, bajt) tablicy przekątnych: piksel x wiersza r leży na przekątnej r + x + 1."""
+    s0, s1, s2 = diagonals.strides
+    return np.lib.stride_tricks.as_strided(diagonals[1:], shape=(rows, width, diagonals.shape[2]),
+                                           strides=(s0 + s1, s0, s2))
+
+
+def _unfilter_wavefront(filters, lines, prior, bpp):
+    """
+    Odwraca filtry bloku wierszy falą po przekątnych. Piksel zależy tylko od lewego,
+    górnego i lewego górnego sąsiada, więc wszystkie piksele na przekątnej (wiersz + kolumna
+    = const) można policzyć naraz - jedna seria operacji NumPy na krok zamiast pętli po bajtach.
+    Przekątne leżą w pamięci ciągiem (tablica [przekątna, wiersz, bajt piksela]).
+    """
+    rows, row_bytes = lines.shape
+    width = row_bytes // bpp
+    recon = np.zeros((width + rows + 1, rows + 1, bpp), dtype=np.int16)
+    filtered = np.zeros_like(recon)
+    _skewed(recon, rows + 1, width)[0] = prior.reshape(width, bpp)
+    _skewed(filtered, rows + 1, width)[1:] = lines.reshape(rows, width, bpp)
+    # Wiersz 0 to poprzedni (już zrekonstruowany) wiersz - jego wag nikt nie odczytuje
+    filter_types = np.concatenate(([0], filters))
+    weight_left = _FILTER_WEIGHTS[filter_types, 0][:, None]
+    weight_up = _FILTER_WEIGHTS[filter_types, 1][:, None]
+    is_paeth = (filter_types == 4)[:, None]
+    any_paeth = is_paeth.any()
+
+    for diagonal in range(2, width + rows + 1):
+        lo = max(1, diagonal - width)
+        hi = min(rows, diagonal - 1) + 1
+        a = recon[diagonal - 1, lo:hi]
+        b = recon[diagonal - 1, lo - 1:hi - 1]
+        pred = a * weight_left[lo:hi]
+        pred += b * weight_up[lo:hi]
+        pred >>= 1
+        if any_paeth:
+            c = recon[diagonal - 2, lo - 1:hi - 1]
+            pa = np.abs(b - c)
+            pb = np.abs(a - c)
+            pc = np.abs(a + b - c - c)
+            paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+            np.copyto(pred, paeth, where=is_paeth[lo:hi])
+        pred += filtered[diagonal, lo:hi]
+        pred &= 0xFF
+        recon[diagonal, lo:hi] = pred
+    return _skewed(recon, rows + 1, width)[1:].reshape(rows, row_bytes).astype(np.uint8)
+
+
+def unfilter_rows(filters, lines, prior, bpp):
+    """
+    Odwraca filtry bloku kolejnych wierszy.
+    filters - typy filtrów wierszy, lines - przefiltrowane bajty (wiersze, bajty w wierszu)
+    uint8, prior - zrekonstruowany wiersz przed blokiem. Zwraca nową tablicę uint8.
+    Przy wielu wierszach Average/Paeth blok liczony jest falą po przekątnych, w przeciwnym
+    razie wiersz po wierszu (unfilter_scanline).
+    """
+    rows, row_bytes = lines.shape
+    unknown = filters[filters > 4]
+    if unknown.size:
+        raise ValueError(f"Nieznany typ filtra wiersza: {unknown[0]}")
+    sequential_rows = np.count_nonzero(filters >= 3)
+    if sequential_rows * row_bytes >= WAVEFRONT_STEP_BYTES * (row_bytes // bpp + rows):
+        return _unfilter_wavefront(filters, lines, prior, bpp)
+    out = np.empty_like(lines)
+    for index in range(rows):
+        out[index] = unfilter_scanline(filters[index], lines[index], prior, bpp)
+        prior = out[index]
+    return out
+
+
+def iter_row_blocks(idat_data, ihdr_info):
+    """
+    Generator zrekonstruowanych (odfiltrowanych) bloków wierszy.
+    idat_data - iterowalny zbiór fragmentów skompresowanych danych (np. dane kolejnych IDAT).
+    Zwraca krotki (numer przebiegu, numer pierwszego wiersza bloku w przebiegu,
+    tablica (wiersze, bajty w wierszu) uint8). Pamięć ograniczona jest do jednego bloku
+    (UNFILTER_BLOCK_ROWS wierszy, ok. UNFILTER_BLOCK_BYTES) i bufora dekompresji.
+    """
+    channels, bits_per_pixel, bpp = _image_layout(ihdr_info)
+    decompressor = zlib.decompressobj()
+    buffer = bytearray()
+    pieces = iter(idat_data)
+    finished = False
+
+    def fill(size):
+        nonlocal finished
+        while len(buffer) < size:
+            if decompressor.unconsumed_tail:
+                buffer.extend(decompressor.decompress(decompressor.unconsumed_tail, DECOMPRESS_CHUNK_SIZE))
+                continue
+            if finished:
+                return False
+            piece = next(pieces, None)
+            if piece is None:
+                finished = True
+                buffer.extend(decompressor.flush())
+                continue
+            buffer.extend(decompressor.decompress(piece, DECOMPRESS_CHUNK_SIZE))
+        return True
+
+    def take_rows(count, stride, prior):
+        rows = np.frombuffer(buffer, dtype=np.uint8, count=count * stride).reshape(count, stride)
+        recon = unfilter_rows(rows[:, 0], rows[:, 1:], prior, bpp)
+        # Widok na bufor musi zniknąć przed usunięciem wierszy z bytearray
+        del rows
+        del buffer[:count * stride]
+        return recon
+
+    for pass_index, (pass_width, pass_height) in enumerate(_pass_sizes(ihdr_info)):
+        if pass_width == 0 or pass_height == 0:
+            continue
+        stride = _row_bytes(pass_width, bits_per_pixel) + 1
+        block_rows = max(1, min(UNFILTER_BLOCK_ROWS, UNFILTER_BLOCK_BYTES // stride))
+        prior = np.zeros(stride - 1, dtype=np.uint8)
+        row = 0
+        while row < pass_height:
+            count = min(block_rows, pass_height - row)
+            try:
+                if not fill(count * stride):
+                    raise ValueError("Dane IDAT są niekompletne – zbyt mało danych obrazu.")
+            except Exception:
+                # Wiersze odebrane w całości przed przerwaniem danych trafiają jeszcze do wyniku
+                count = min(count, len(buffer) // stride)
+                if count:
+                    yield pass_index, row, take_rows(count, stride, prior)
+                raise
+            block = take_rows(count, stride, prior)
+            yield pass_index, row, block
+            prior = block[-1]
+            row += count
+
+
+def iter_scanlines(idat_data, ihdr_info):
+    """
+    Generator zrekonstruowanych (odfiltrowanych) wierszy.
+    idat_data - iterowalny zbiór fragmentów skompresowanych danych (np. dane kolejnych IDAT).
+    Zwraca krotki (numer przebiegu, numer wiersza w przebiegu, bajty wiersza jako uint8).
+    """
+    for pass_index, first_row, block in iter_row_blocks(idat_data, ihdr_info):
+        for offset, recon in enumerate(block):
+            yield pass_index, first_row + offset, recon
+
+
+def iter_decoded_rows(idat_data, ihdr_info):
+    """
+    Dekoduje obraz wiersz po wierszu (dla bardzo wysokich obrazów).
+    Dla obrazów z przeplotem Adam7 wiersze są dostępne dopiero po zdekodowaniu całości.
+    """
+    if ihdr_info['interlace_method'] == 1:
+        yield from decode_idat(idat_data, ihdr_info)
+        return
+    channels = CHANNELS[ihdr_info['color_type']]
+    bit_depth = ihdr_info['bit_depth']
+    width = ihdr_info['width']
+    dtype = output_dtype(ihdr_info)
+    for _, _, block in iter_row_blocks(idat_data, ihdr_info):
+        yield from _unpack_scanline(block, width, channels, bit_depth).astype(dtype, copy=False)
+
+
+def _output_buffer(ihdr_info, out):
+    shape = output_shape(ihdr_info)
+    dtype = output_dtype(ihdr_info)
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if out.shape != shape or out.dtype != dtype:
+        raise ValueError(f"Bufor wyjściowy musi mieć kształt {shape} i typ {np.dtype(dtype).name}")
+    return out
+
+
+def decode_idat(idat_data, ihdr_info, out=None):
+    """
+    Dekoduje dane IDAT do tablicy NumPy.
+    Kształt: (wysokość, szerokość) dla skali szarości i obrazów paletowych (indeksy),
+    (wysokość, szerokość, kanały) w pozostałych przypadkach; typ uint8 lub uint16.
+    Wynik zapisywany jest do podanego bufora out, jeśli go przekazano - blok po bloku
+    wierszy, bez łączenia danych IDAT ani pośredniej kopii całego obrazu.
+    """
+    out = _output_buffer(ihdr_info, out)
+    channels = CHANNELS[ihdr_info['color_type']]
+    bit_depth = ihdr_info['bit_depth']
+    pass_sizes = _pass_sizes(ihdr_info)
+    interlaced = ihdr_info['interlace_method'] == 1
+
+    for pass_index, first_row, block in iter_row_blocks(idat_data, ihdr_info):
+        values = _unpack_scanline(block, pass_sizes[pass_index][0], channels, bit_depth)
+        if interlaced:
+            x0, y0, dx, dy = ADAM7_PASSES[pass_index]
+            start = y0 + first_row * dy
+            out[start:start + len(block) * dy:dy, x0::dx] = values
+        else:
+            out[first_row:first_row + len(block)] = values
+    return out
+
+
+def decode_raw_rows(idat_data, ihdr_info):
+    """
+    Zwraca zrekonstruowane (odfiltrowane), ale nierozpakowane wiersze obrazu bez przeplotu:
+    tablica (wysokość, bajty w wierszu) uint8, łącznie z bitami dopełnienia na końcu wierszy.
+    """
+    if ihdr_info['interlace_method'] != 0:
+        raise ValueError("Surowe wiersze dostępne są tylko dla obrazów bez przeplotu")
+    _, bits_per_pixel, _ = _image_layout(ihdr_info)
+    out = np.empty((ihdr_info['height'], _row_bytes(ihdr_info['width'], bits_per_pixel)), dtype=np.uint8)
+    for _, first_row, block in iter_row_blocks(idat_data, ihdr_info):
+        out[first_row:first_row + len(block)] = block
+    return out
+
+
+def decode_chunks(chunks, out=None):
+    """Dekoduje obraz z listy chunków zwróconej przez png_handler.read_png_file."""
+    ihdr_info = None
+    idat_chunks = []
+    for chunk in chunks:
+        if chunk['type'] == 'IHDR':
+            ihdr_info = parse_ihdr_chunk(chunk['data'])
+        elif chunk['type'] == 'IDAT':
+            idat_chunks.append(chunk)
+    if ihdr_info is None:
+        raise ValueError("Brakuje chunka IHDR – plik PNG jest nieprawidłowy.")
+    if not idat_chunks:
+        raise ValueError("Brak chunków IDAT – brak danych obrazu.")
+    return decode_idat(iter_idat_data(idat_chunks), ihdr_info, out)
+
+
+def decode_stream(source, out=None, buffer_size=png_handler.STREAM_READ_SIZE):
+    """
+    Dekoduje obraz PNG w trakcie odbierania danych z dowolnego źródła bajtów
+    (potok, sys.stdin.buffer, iterowalne bloki). Dane IDAT trafiają prosto do
+    dekompresora bez buforowania całego strumienia.
+    Zwraca (piksele, lista chunków - dla IDAT z 'data' = None). Przy obciętym wejściu
+    zgłaszany jest png_handler.TruncatedPngError z atrybutem pixels (wiersze
+    zdekodowane do momentu przerwania, reszta wyzerowana).
+    """
+    pending = deque()
+    parser = png_handler.PngStreamParser(idat_sink=pending.append)
+    blocks = png_handler.iter_byte_blocks(source, buffer_size)
+
+    def next_block():
+        data = next(blocks, None)
+        if data is None:
+            parser.close()
+        return data
+
+    ihdr_info = None
+    while ihdr_info is None:
+        data = next_block()
+        if parser.finished or data is None:
+            raise ValueError("Brakuje chunka IHDR – plik PNG jest nieprawidłowy.")
+        for chunk in parser.feed(data):
+            if chunk['type'] != 'IHDR':
+                raise ValueError("Brakuje chunka IHDR – plik PNG jest nieprawidłowy.")
+            ihdr_info = parse_ihdr_chunk(chunk['data'])
+            break
+
+    def idat_pieces():
+        while True:
+            while pending:
+                yield pending.popleft()
+            if parser.finished:
+                return
+            data = next_block()
+            if data is not None:
+                parser.feed(data)
+
+    if out is None:
+        out = np.zeros(output_shape(ihdr_info), dtype=output_dtype(ihdr_info))
+    try:
+        decode_idat(idat_pieces(), ihdr_info, out)
+    except png_handler.TruncatedPngError as e:
+        e.pixels = out
+        raise
+    return out, parser.chunks
+
+
+def iter_idat_data(chunks):
+    """Zwraca kolejne dane chunków IDAT (png_handler.chunk_payload)."""
+    for chunk in chunks:
+        if chunk['type'] == 'IDAT':
+            yield png_handler.chunk_payload(chunk)
+
+
+def find_palette(chunks):
+    for chunk in chunks:
+        if chunk['type'] == 'PLTE':
+            return np.frombuffer(chunk['data'], dtype=np.uint8).reshape(-1, 3)
+    return None
+
+
+def to_grayscale(pixels, ihdr_info, palette=None):
+    """
+    Konwertuje zdekodowane piksele do 8-bitowej skali szarości
+    (te same współczynniki co w PIL: L = R*299/1000 + G*587/1000 + B*114/1000).
+    """
+    color_type = ihdr_info['color_type']
+    bit_depth = ihdr_info['bit_depth']
+
+    if color_type == 3:
+        if palette is None:
+            raise ValueError("Obraz paletowy wymaga chunka PLTE")
+        rgb = palette[pixels]
+    elif bit_depth == 16:
+        rgb = (pixels >> 8).astype(np.uint8)
+    elif bit_depth < 8:
+        # Skalowanie wartości 1/2/4-bitowych do pełnego zakresu 0-255
+        rgb = (pixels * (255 // ((1 << bit_depth) - 1))).astype(np.uint8)
+    else:
+        rgb = pixels
+
+    if color_type in (0, 4):
+        return rgb if color_type == 0 else rgb[..., 0]
+    r = rgb[..., 0].astype(np.uint32)
+    g = rgb[..., 1].astype(np.uint32)
+    b = rgb[..., 2].astype(np.uint32)
+    return ((r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+
+def find_transparency(chunks):
+    """Surowe dane chunka tRNS (albo None)."""
+    for chunk in chunks:
+        if chunk['type'] == 'tRNS':
+            return bytes(chunk['data'])
+    return None
+
+
+def to_rgba(pixels, ihdr_info, palette=None, transparency=None):
+    """
+    Konwertuje zdekodowane piksele do RGBA (wysokość, szerokość, 4): uint8, a dla
+    głębi 16 bitów uint16. Obrazy paletowe rozwijane są przez PLTE, wartości 1/2/4-bitowe
+    skalowane do 8 bitów; przezroczystość z tRNS (dane chunka) trafia do kanału alfa.
+    """
+    color_type = ihdr_info['color_type']
+    bit_depth = ihdr_info['bit_depth']
+    dtype = np.uint16 if bit_depth == 16 else np.uint8
+    maximum = np.iinfo(dtype).max
+
+    if color_type == 3:
+        if palette is None:
+            raise ValueError("Obraz paletowy wymaga chunka PLTE")
+        table = np.full((256, 4), 255, dtype=np.uint8)
+        table[:len(palette), :3] = palette
+        if transparency:
+            alpha = np.frombuffer(transparency, dtype=np.uint8)[:len(palette)]
+            table[:len(alpha), 3] = alpha
+        return table[pixels]
+
+    rgba = np.empty(pixels.shape[:2] + (4,), dtype=dtype)
+    if color_type in (0, 4):
+        gray = pixels if color_type == 0 else pixels[..., 0]
+        scaled = gray * (255 // ((1 << bit_depth) - 1)) if bit_depth < 8 else gray
+        rgba[..., :3] = scaled[..., None]
+    else:
+        rgba[..., :3] = pixels[..., :3]
+
+    if color_type in (4, 6):
+        rgba[..., 3] = pixels[..., -1]
+    else:
+        rgba[..., 3] = maximum
+        if transparency:
+            # Kolor (lub poziom szarości) oznaczony jako w pełni przezroczysty
+            key = np.frombuffer(transparency, dtype='>u2')
+            if color_type == 0:
+                rgba[gray == key[0], 3] = 0
+            else:
+                rgba[(pixels == key[:3]).all(axis=-1), 3] = 0
+    return rgba
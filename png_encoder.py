@@ -0,0 +1,178 @@
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from png_decoder import _image_layout
+
+STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+# Rozmiar bloku kompresowanego niezależnie i rozmiar słownika (okno deflate)
+DEFLATE_BLOCK_SIZE = 256 * 1024
+DEFLATE_WINDOW = 32 * 1024
+FILTER_BLOCK_ROWS = 256
+
+
+def build_ihdr(width, height, bit_depth, color_type, interlace_method=0):
+    """Dane chunku IHDR (13 bajtów)."""
+    return struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, interlace_method)
+
+
+def pack_pixels(pixels, ihdr_info):
+    """
+    Zamienia tablicę pikseli (w formacie zwracanym przez png_decoder.decode_idat)
+    na surowe bajty wierszy: tablica (wysokość, bajty w wierszu) typu uint8.
+    """
+    channels, bits_per_pixel, _ = _image_layout(ihdr_info)
+    height, width = ihdr_info['height'], ihdr_info['width']
+    bit_depth = ihdr_info['bit_depth']
+    pixels = np.asarray(pixels)
+
+    if bit_depth == 16:
+        return pixels.astype('>u2').reshape(height, width * channels).view(np.uint8)
+    if bit_depth == 8:
+        return np.ascontiguousarray(pixels, dtype=np.uint8).reshape(height, width * channels)
+
+    # Głębie 1/2/4: łączenie kilku pikseli w bajt, najstarsze bity pierwsze
+    per_byte = 8 // bit_depth
+    row_bytes = (width + per_byte - 1) // per_byte
+    values = np.zeros((height, row_bytes * per_byte), dtype=np.uint8)
+    values[:, :width] = pixels.reshape(height, width)
+    shifts = np.arange(8 - bit_depth, -1, -bit_depth, dtype=np.uint8)
+    return (values.reshape(height, row_bytes, per_byte) << shifts).sum(axis=2, dtype=np.uint8)
+
+
+def _paeth_predictor(left, up, up_left):
+    a = left.astype(np.int16)
+    b = up.astype(np.int16)
+    c = up_left.astype(np.int16)
+    pa = np.abs(b - c)
+    pb = np.abs(a - c)
+    pc = np.abs(a + b - 2 * c)
+    return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c)).astype(np.uint8)
+
+
+def _filter_candidates(rows, prior, bpp):
+    """Wszystkie pięć filtrów dla bloku wierszy naraz: tablica (5, wiersze, bajty)."""
+    up = np.concatenate((prior[None], rows[:-1]))
+    left = np.zeros_like(rows)
+    left[:, bpp:] = rows[:, :-bpp]
+    up_left = np.zeros_like(up)
+    up_left[:, bpp:] = up[:, :-bpp]
+    average = ((left.astype(np.uint16) + up) >> 1).astype(np.uint8)
+    return np.stack((
+        rows,
+        rows - left,
+        rows - up,
+        rows - average,
+        rows - _paeth_predictor(left, up, up_left),
+    ))
+
+
+def filter_scanlines(raw, ihdr_info, filter_mode='heuristic'):
+    """
+    Filtruje surowe wiersze i dokleja bajt typu filtra: wynik (wysokość, 1 + bajty w wierszu).
+    filter_mode: numer filtra 0-4 dla wszystkich wierszy albo 'heuristic' - dla każdego
+    wiersza wybierany jest filtr o najmniejszej sumie wartości bezwzględnych (jak w libpng).
+    Obrazy paletowe i o głębi < 8 bitów nie są filtrowane (zalecenie specyfikacji PNG).
+    """
+    _, _, bpp = _image_layout(ihdr_info)
+    height, row_bytes = raw.shape
+    out = np.empty((height, row_bytes + 1), dtype=np.uint8)
+
+    if filter_mode == 'heuristic' and (ihdr_info['color_type'] == 3 or ihdr_info['bit_depth'] < 8):
+        filter_mode = 0
+
+    prior = np.zeros(row_bytes, dtype=np.uint8)
+    for start in range(0, height, FILTER_BLOCK_ROWS):
+        rows = raw[start:start + FILTER_BLOCK_ROWS]
+        if filter_mode == 0:
+            out[start:start + len(rows), 0] = 0
+            out[start:start + len(rows), 1:] = rows
+        else:
+            candidates = _filter_candidates(rows, prior, bpp)
+            if filter_mode == 'heuristic':
+                # Bajty traktowane jako liczby ze znakiem: koszt min(v, 256 - v)
+                cost = np.minimum(candidates, 256 - candidates.astype(np.int16)).sum(axis=2)
+                chosen = cost.argmin(axis=0)
+            else:
+                chosen = np.full(len(rows), int(filter_mode))
+            out[start:start + len(rows), 0] = chosen
+            out[start:start + len(rows), 1:] = candidates[chosen, np.arange(len(rows))]
+        prior = rows[-1]
+    return out
+
+
+def _zlib_header(level):
+    """Nagłówek strumienia zlib (CMF, FLG) dla danego poziomu kompresji."""
+    cmf = 0x78
+    if level in (0, 1):
+        flevel = 0
+    elif 2 <= level <= 5:
+        flevel = 1
+    elif level in (6, -1):
+        flevel = 2
+    else:
+        flevel = 3
+    flg = flevel << 6
+    flg += 31 - ((cmf * 256 + flg) % 31)
+    return bytes((cmf, flg))
+
+
+def _deflate_block(data, start, end, level, strategy, last):
+    # Ostatnie 32 KiB poprzedniego bloku jako słownik - jak w pigz, kompresja prawie bez strat
+    if start > 0:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, strategy,
+                                      zdict=data[max(0, start - DEFLATE_WINDOW):start])
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, strategy)
+    out = compressor.compress(data[start:end])
+    # Z_SYNC_FLUSH wyrównuje blok do bajtu i nie kończy strumienia
+    return out + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def parallel_deflate(data, level=6, strategy=zlib.Z_DEFAULT_STRATEGY, workers=None,
+                     block_size=DEFLATE_BLOCK_SIZE):
+    """
+    Kompresuje dane do jednego poprawnego strumienia zlib, dzieląc je na niezależne bloki
+    kompresowane równolegle w wątkach (zlib zwalnia GIL), a następnie sklejane.
+    Suma Adler-32 liczona jest dla całości danych.
+    """
+    data = memoryview(data).cast('B')
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(data) <= block_size:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+        return compressor.compress(data) + compressor.flush()
+
+    bounds = [(start, min(start + block_size, len(data))) for start in range(0, len(data), block_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_deflate_block, data, start, end, level, strategy, end == len(data))
+                   for start, end in bounds]
+        adler = zlib.adler32(data)
+        blocks = [future.result() for future in futures]
+    return _zlib_header(level) + b''.join(blocks) + struct.pack('>I', adler & 0xffffffff)
+
+
+def encode_scanlines(raw, ihdr_info, level=6, strategy=zlib.Z_DEFAULT_STRATEGY,
+                     filter_mode='heuristic', workers=None):
+    """Filtruje i kompresuje surowe wiersze (wynik pack_pixels) do strumienia danych IDAT."""
+    if ihdr_info['interlace_method'] != 0:
+        raise ValueError("Kodowanie z przeplotem Adam7 nie jest obsługiwane")
+    filtered = filter_scanlines(raw, ihdr_info, filter_mode)
+    return parallel_deflate(filtered, level, strategy, workers)
+
+
+def encode_idat(pixels, ihdr_info, level=6, strategy=zlib.Z_DEFAULT_STRATEGY,
+                filter_mode='heuristic', workers=None):
+    """
+    Koduje piksele do skompresowanego strumienia danych IDAT (bez przeplotu).
+    Zwraca bajty gotowe do zapisania w jednym lub wielu chunkach IDAT.
+    """
+    return encode_scanlines(pack_pixels(pixels, ihdr_info), ihdr_info, level, strategy, filter_mode, workers)
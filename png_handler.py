@@ -1,45 +1,289 @@
+import mmap
+import os
 import struct
 import zlib
-import matplotlib.pyplot as plt
-from utils import parse_itxt_chunk_data,  generate_palette_image_numpy, parse_ihdr_chunk
-
-def _read_chunk(file):
-    """Odczytuje pojedynczy chunk z pliku PNG."""
-    try:
-        length_bytes = file.read(4)
-        if not length_bytes:
-            return None
-        length = struct.unpack('>I', length_bytes)[0]
-
-        type_bytes = file.read(4)
-        chunk_type = type_bytes.decode('ascii')
+from ancillary import iter_ancillary_records
+from utils import generate_palette_image_numpy, parse_ihdr_chunk
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class PngChunk:
+    """
+    Lekki chunk PNG wskazujący na fragment zmapowanego pliku.
+    Dane (memoryview) tworzone są dopiero przy odczycie atrybutu `data`.
+    Obsługuje też dotychczasowy dostęp słownikowy: chunk['type'], chunk['data'] itd.
+    """
+    __slots__ = ('type', 'offset', 'length', 'crc_offset', '_buffer')
+
+    def __init__(self, buffer, chunk_type, offset, length, crc_offset):
+        self._buffer = buffer
+        self.type = chunk_type
+        self.offset = offset
+        self.length = length
+        self.crc_offset = crc_offset
+
+    @property
+    def data(self):
+        """Dane chunku jako memoryview (bez kopiowania)."""
+        return self._buffer[self.offset:self.offset + self.length]
+
+    @property
+    def crc(self):
+        return bytes(self._buffer[self.crc_offset:self.crc_offset + 4])
+
+    def __getitem__(self, key):
+        # Zgodność ze słownikowym API - 'data' zwracane jako bytes
+        if key == 'data':
+            return bytes(self.data)
+        if key in ('type', 'length', 'crc'):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"PngChunk(type={self.type!r}, offset={self.offset}, length={self.length})"
+
+
+def index_png_chunks(buffer):
+    """
+    Buduje w jednym przejściu indeks chunków (typ, offset, długość, pozycja CRC)
+    na podstawie bufora z zawartością pliku PNG (np. mmap). Dane nie są kopiowane.
+    Bufor kończący się przed chunkiem IEND zgłaszany jest wyjątkiem TruncatedPngError
+    z indeksem kompletnych chunków (jak w PngStreamParser.close).
+    """
+    view = memoryview(buffer)
+    if bytes(view[:8]) != PNG_SIGNATURE:
+        raise ValueError("To nie jest prawidłowy plik PNG")
+
+    chunks = []
+    pos = 8
+    size = len(view)
+    partial = None
+    while pos + 8 <= size:
+        length, type_bytes = struct.unpack_from('>I4s', view, pos)
+        data_offset = pos + 8
+        crc_offset = data_offset + length
+        if crc_offset + 4 > size:
+            # Obcięty plik - ostatni chunk jest niekompletny
+            partial = {'type': type_bytes.decode('ascii'), 'length': length,
+                       'received': min(length, size - data_offset)}
+            break
+        chunk = PngChunk(view, type_bytes.decode('ascii'), data_offset, length, crc_offset)
+        chunks.append(chunk)
+        if chunk.type == 'IEND':
+            return chunks
+        pos = crc_offset + 4
+    raise TruncatedPngError("Nieoczekiwany koniec pliku PNG – plik jest obcięty.", chunks, partial, size)
+
+
+def map_png_file(file_path):
+    """Mapuje plik PNG do pamięci i zwraca indeks jego chunków (lista PngChunk)."""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("To nie jest prawidłowy plik PNG")
+        # Mapowanie pozostaje ważne po zamknięciu pliku
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return index_png_chunks(mapped)
+
+
+def read_png_file(file_path, use_mmap=False):
+    """
+    Odczytuje plik PNG, sprawdza sygnaturę i zwraca listę chunków.
+    Przy use_mmap=True plik jest mapowany do pamięci, a zwracane chunki (PngChunk)
+    udostępniają dane leniwie, bez kopiowania. Obcięty plik zgłaszany jest
+    wyjątkiem TruncatedPngError z dotychczas odczytanymi chunkami.
+    """
+    if use_mmap:
+        chunks = map_png_file(file_path)
+        print("=== Sygnatura PNG poprawna ===")
+        return chunks
 
-        data = file.read(length)
-        crc = file.read(4)
+    with open(file_path, 'rb') as f:
+        chunks = read_png_stream(f)
+    print("=== Sygnatura PNG poprawna ===")
+    return chunks
 
-        return {'length': length, 'type': chunk_type, 'data': data, 'crc': crc}
-    except (struct.error, IndexError):
-        return None
 
-def read_png_file(file_path):
-    """Odczytuje plik PNG, sprawdza sygnaturę i zwraca listę chunków."""
-    with open(file_path, 'rb') as f:
-        if f.read(8) != b'\x89PNG\r\n\x1a\n':
+# Maksymalny rozmiar chunka buforowanego w całości przy odczycie strumieniowym
+MAX_BUFFERED_CHUNK_SIZE = 64 * 1024 * 1024
+STREAM_READ_SIZE = 64 * 1024
+
+
+class TruncatedPngError(ValueError):
+    """
+    Strumień PNG skończył się przed chunkiem IEND.
+    chunks - chunki odczytane w całości, partial - opis niedokończonego chunka (lub None),
+    received - liczba odebranych bajtów.
+    """
+
+    def __init__(self, message, chunks=(), partial=None, received=0):
+        super().__init__(message)
+        self.chunks = list(chunks)
+        self.partial = partial
+        self.received = received
+
+
+class PngStreamParser:
+    """
+    Parser PNG zasilany porcjami bajtów (feed) - niezależny od źródła danych.
+    Chunki zwracane są jako słowniki {'type', 'length', 'data', 'crc'}, gdy tylko
+    nadejdą w całości. Buforowany jest co najwyżej jeden chunk (max_chunk_size).
+    Z podanym idat_sink dane IDAT nie są buforowane: każdy odebrany fragment trafia
+    od razu do idat_sink (np. decompressobj().decompress), a chunk IDAT ma 'data' = None.
+    """
+
+    def __init__(self, max_chunk_size=MAX_BUFFERED_CHUNK_SIZE, idat_sink=None):
+        self.max_chunk_size = max_chunk_size
+        self.idat_sink = idat_sink
+        self.chunks = []
+        self.received = 0
+        self.finished = False
+        self._buffer = bytearray()
+        self._signature_ok = False
+        self._current = None
+
+    def feed(self, data):
+        """Dodaje kolejne bajty i zwraca listę chunków, które zostały w ten sposób ukończone."""
+        buffer = self._buffer
+        buffer += data
+        self.received += len(data)
+        ready = []
+        while not self.finished:
+            if not self._signature_ok:
+                if len(buffer) < 8:
+                    break
+                if bytes(buffer[:8]) != PNG_SIGNATURE:
+                    raise ValueError("To nie jest prawidłowy plik PNG")
+                del buffer[:8]
+                self._signature_ok = True
+                continue
+
+            current = self._current
+            if current is None:
+                if len(buffer) < 8:
+                    break
+                length, type_bytes = struct.unpack_from('>I4s', buffer)
+                if length > 0x7fffffff:
+                    raise ValueError(f"Nieprawidłowa długość chunka: {length}")
+                streamed = type_bytes == b'IDAT' and self.idat_sink is not None
+                if not streamed and length > self.max_chunk_size:
+                    raise ValueError(f"Chunk {type_bytes!r} ma {length} bajtów - więcej niż limit "
+                                     f"{self.max_chunk_size} bajtów")
+                self._current = {'type': type_bytes.decode('ascii'), 'length': length,
+                                 'remaining': length if streamed else 0, 'streamed': streamed}
+                del buffer[:8]
+                continue
+
+            if current['remaining']:
+                if not buffer:
+                    break
+                piece = bytes(buffer[:current['remaining']])
+                del buffer[:len(piece)]
+                current['remaining'] -= len(piece)
+                self.idat_sink(piece)
+                continue
+
+            data_size = 0 if current['streamed'] else current['length']
+            if len(buffer) < data_size + 4:
+                break
+            chunk = {
+                'length': current['length'],
+                'type': current['type'],
+                'data': None if current['streamed'] else bytes(buffer[:data_size]),
+                'crc': bytes(buffer[data_size:data_size + 4]),
+            }
+            del buffer[:data_size + 4]
+            self._current = None
+            self.chunks.append(chunk)
+            ready.append(chunk)
+            self.finished = chunk['type'] == 'IEND'
+        return ready
+
+    def close(self):
+        """Kończy odczyt; zgłasza TruncatedPngError, jeśli nie dotarł chunk IEND."""
+        if self.finished:
+            return self.chunks
+        if not self._signature_ok:
             raise ValueError("To nie jest prawidłowy plik PNG")
-
-        print("=== Sygnatura PNG poprawna ===")
-        chunks = []
+        partial = None
+        if self._current is not None:
+            received = self._current['length'] - self._current['remaining'] if self._current['streamed'] \
+                else len(self._buffer)
+            partial = {'type': self._current['type'], 'length': self._current['length'], 'received': received}
+        raise TruncatedPngError("Nieoczekiwany koniec pliku PNG – plik jest obcięty.",
+                                self.chunks, partial, self.received)
+
+
+def iter_byte_blocks(source, size):
+    """Kolejne porcje bajtów z obiektu z metodą read (plik, potok, stdin) lub z iterowalnego źródła."""
+    read = getattr(source, 'read1', None) or getattr(source, 'read', None)
+    if read is None:
+        yield from source
+        return
+    while True:
+        # read1 zwraca dane dostępne od razu - przy potokach nie czekamy na pełny blok
+        data = read(size)
+        if not data:
+            return
+        yield data
+
+
+def iter_png_chunks(source, buffer_size=STREAM_READ_SIZE, max_chunk_size=MAX_BUFFERED_CHUNK_SIZE,
+                    idat_sink=None):
+    """
+    Generator chunków PNG z dowolnego źródła bajtów: pliku, potoku, sys.stdin.buffer
+    (także nieprzeszukiwalnych) lub iterowalnego zbioru bloków bytes.
+    Każdy chunk zwracany jest zaraz po odebraniu; obcięte wejście kończy się
+    wyjątkiem TruncatedPngError z częściowym wynikiem.
+    """
+    parser = PngStreamParser(max_chunk_size, idat_sink)
+    for data in iter_byte_blocks(source, buffer_size):
+        yield from parser.feed(data)
+        if parser.finished:
+            return
+    parser.close()
+
+
+async def aiter_png_chunks(source, buffer_size=STREAM_READ_SIZE, max_chunk_size=MAX_BUFFERED_CHUNK_SIZE,
+                           idat_sink=None):
+    """
+    Asynchroniczny odpowiednik iter_png_chunks dla asyncio.StreamReader (lub obiektu
+    z korutyną read) albo asynchronicznie iterowalnego źródła bloków bytes.
+    """
+    parser = PngStreamParser(max_chunk_size, idat_sink)
+    if hasattr(source, 'read'):
         while True:
-            chunk = _read_chunk(f)
-            if chunk is None or chunk['type'] == 'IEND':
-                if chunk:
-                    chunks.append(chunk)
+            data = await source.read(buffer_size)
+            if not data:
                 break
-            chunks.append(chunk)
-    return chunks
-
-def print_critical_chunks_info(chunks, additional_info=False):
-    """Przetwarza i wyświetla informacje z krytycznych chunków."""
+            for chunk in parser.feed(data):
+                yield chunk
+            if parser.finished:
+                return
+    else:
+        async for data in source:
+            for chunk in parser.feed(data):
+                yield chunk
+            if parser.finished:
+                return
+    parser.close()
+
+
+def read_png_stream(source, buffer_size=STREAM_READ_SIZE, max_chunk_size=MAX_BUFFERED_CHUNK_SIZE):
+    """Odczytuje wszystkie chunki ze strumienia (np. sys.stdin.buffer) do listy."""
+    return list(iter_png_chunks(source, buffer_size, max_chunk_size))
+
+def print_critical_chunks_info(chunks, additional_info=False, pixels=None):
+    """
+    Przetwarza i wyświetla informacje z krytycznych chunków.
+    pixels - opcjonalnie już zdekodowane indeksy obrazu paletowego (bez ponownego dekodowania).
+    """
     print("\n=== Informacje z krytycznych chunków ===")
     palette_numpy_array = None
     for chunk in chunks:
@@ -62,12 +306,28 @@ def print_critical_chunks_info(chunks, additional_info=False):
             palette_data = chunk['data']
             num_entries = len(palette_data) // 3
             print(f"Liczba wpisów w palecie: {num_entries}")
-            
+
+            # Histogram użycia wpisów (tylko dla obrazów paletowych - wymaga dekodowania IDAT)
+            usage = None
+            if ihdr_info['color_type'] == 3:
+                # NumPy ładowany dopiero dla obrazów paletowych
+                import png_palette
+                try:
+                    if pixels is not None:
+                        usage = png_palette.palette_usage(pixels, num_entries)
+                    else:
+                        usage = png_palette.chunk_palette_usage(chunks)
+                except (ValueError, zlib.error) as e:
+                    print(f"  (Nie udało się policzyć użycia palety: {e})")
+            if usage is not None:
+                print(f"Używane wpisy: {int((usage != 0).sum())} z {num_entries}")
+
             for i in range(num_entries):
                 r = palette_data[i * 3]
                 g = palette_data[i * 3 + 1]
                 b = palette_data[i * 3 + 2]
-                print(f"  Indeks {i:03d}: RGB({r:3d}, {g:3d}, {b:3d}) | HEX: #{r:02X}{g:02X}{b:02X}")
+                usage_info = f" | Piksele: {usage[i]}" if usage is not None else ""
+                print(f"  Indeks {i:03d}: RGB({r:3d}, {g:3d}, {b:3d}) | HEX: #{r:02X}{g:02X}{b:02X}{usage_info}")
 
             # Tablica palety do wygenerowania obrazu
             palette_numpy_array = generate_palette_image_numpy(palette_data)
@@ -85,6 +345,8 @@ def print_critical_chunks_info(chunks, additional_info=False):
                 print(f"  CRC: {chunk['crc'].hex()}")
 
     if palette_numpy_array is not None:
+        # matplotlib importowany tylko wtedy, gdy faktycznie zapisujemy obraz
+        import matplotlib.pyplot as plt
         plt.imsave("palette.png", palette_numpy_array)
         print("\nObraz palety zapisano do pliku palette.png")
     
@@ -92,146 +354,153 @@ def print_critical_chunks_info(chunks, additional_info=False):
 
 
 def print_ancillary_chunks_info(chunks, color_type, bit_depth):
-    """Przetwarza i wyświetla informacje z wybranych dodatkowych chunków."""
+    """Przetwarza i wyświetla informacje z dodatkowych chunków obsługiwanych przez rejestr parserów."""
     print("\n=== Informacje z dodatkowych chunków (Ancillary Chunks) ===")
     found_ancillary = False
-    for chunk in chunks:
-        if chunk['type'] == 'tEXt':
-            found_ancillary = True
-            try:
-                # Przykładowy chunk: tEXtAuthor\x00PDF Tools
-                # null_byte_index znajduje pierwszy bajt null, który oddziela słowo kluczowe od tekstu
-                null_byte_index = chunk['data'].find(b'\x00')
-                if null_byte_index != -1:
-                    keyword = chunk['data'][:null_byte_index].decode('latin-1')
-                    text = chunk['data'][null_byte_index + 1:].decode('latin-1')
-                    print(f"\n[tEXt - Dane tekstowe]")
-                    print(f"  Słowo kluczowe: {keyword}")
-                    print(f"{text}")
-                else:
-                    print(f"\n[tEXt - Dane tekstowe] (Nieprawidłowy format - brak separatora null)")
-            except Exception as e:
-                print(f"\n[tEXt - Dane tekstowe] (Błąd dekodowania: {e})")
-
-        elif chunk['type'] == 'zTXt':
-            found_ancillary = True
-            try:
-                # Ten sam przypadek jak w tEXt
-                # Zkompresowany tekst zamiast normalnego tekstu
-                null_byte_index = chunk['data'].find(b'\x00')
-                if null_byte_index != -1:
-                    keyword = chunk['data'][:null_byte_index].decode('latin-1')
-                    compression_method = chunk['data'][null_byte_index + 1]
-                    compressed_text = chunk['data'][null_byte_index + 2:]
-                    decompressed_text = zlib.decompress(compressed_text).decode('latin-1')
-                    print(f"\n[zTXt - Skompresowane dane tekstowe]")
-                    print(f"  Słowo kluczowe: {keyword}")
-                    print(f"  Metoda kompresji: {'Deflate' if compression_method == 0 else 'Nieznana'}")
-                    print(f"  Tekst: {decompressed_text}")
-                else:
-                    print(f"\n[zTXt - Skompresowane dane tekstowe] (Nieprawidłowy format - brak separatora null)")
-            except Exception as e:
-                print(f"\n[zTXt - Skompresowane dane tekstowe] (Błąd dekodowania/dekompresji: {e})")
-
-        elif chunk['type'] == 'iTXt':
-            found_ancillary = True
-            try:
-                parsed_itxt = parse_itxt_chunk_data(chunk['data'])
-                
-                print(f"\n[iTXt - Internacjonalizowane dane tekstowe]")
-                print(f"  Słowo kluczowe: {parsed_itxt['keyword']}")
-                print(f"  Flaga kompresji: {parsed_itxt['compression_flag']} ({'Skompresowany' if parsed_itxt['compression_flag'] == 1 else 'Nieskompresowany'})")
-                print(f"  Metoda kompresji: {parsed_itxt['compression_method']} ({'Deflate' if parsed_itxt['compression_method'] == 0 else 'Brak/Nieznana'})")
-                print(f"  Tag języka: {parsed_itxt['language_tag']}")
-                print(f"  Przetłumaczone słowo kluczowe: {parsed_itxt['translated_keyword']}")
-                print(f"  Tekst: {parsed_itxt['text'][:200]}{'...' if len(parsed_itxt['text']) > 200 else ''}")
-            except Exception as e:
-                print(f"\n[iTXt - Internacjonalizowane dane tekstowe] (Błąd dekodowania/dekompresji: {e})")
-
-        elif chunk['type'] == 'gAMA':
-            found_ancillary = True
-            try:
-                gamma_int = struct.unpack('>I', chunk['data'])[0]
-                gamma = gamma_int / 100000.0
-                print(f"\n[gAMA - Wartość gamma]")
-                print(f"  Gamma: {gamma:.4f}")
-            except Exception as e:
-                print(f"\n[gAMA - Wartość gamma] (Błąd dekodowania: {e})")
-
-        elif chunk['type'] == 'cHRM':
-            found_ancillary = True
-            try:
-                white_point_x, white_point_y, red_x, red_y, green_x, green_y, blue_x, blue_y = \
-                    struct.unpack('>IIIIIIII', chunk['data'])
-                print(f"\n[cHRM - Chromatyczność]")
-                print(f"  Punkt bieli (x, y): ({white_point_x / 100000.0:.5f}, {white_point_y / 100000.0:.5f})")
-                print(f"  Czerwony (x, y): ({red_x / 100000.0:.5f}, {red_y / 100000.0:.5f})")
-                print(f"  Zielony (x, y): ({green_x / 100000.0:.5f}, {green_y / 100000.0:.5f})")
-                print(f"  Niebieski (x, y): ({blue_x / 100000.0:.5f}, {blue_y / 100000.0:.5f})")
-            except Exception as e:
-                print(f"\n[cHRM - Chromatyczność] (Błąd dekodowania: {e})")
-
-        elif chunk['type'] == 'sRGB':
-            found_ancillary = True
-            try:
-                rendering_intent = chunk['data'][0]
-                intents = {0: 'Perceptual', 1: 'Relative colorimetric', 2: 'Saturation', 3: 'Absolute colorimetric'}
-                print(f"\n[sRGB - Standardowy profil kolorów RGB]")
-                print(f"  Intent renderowania: {intents.get(rendering_intent, 'Nieznany')}")
-            except Exception as e:
-                print(f"\n[sRGB - Standardowy profil kolorów RGB] (Błąd dekodowania: {e})")
-
-        elif chunk['type'] == 'bKGD':
-            found_ancillary = True
-            print(f"\n[bKGD - Kolor tła]")
-            if color_type == None or bit_depth == None:
-               print(f"  (Brak informacji o kolorze lub głębi bitowej)")
-            else:
-                try:
-                    if color_type == 0:  # Skala szarości
-                        gray_value = struct.unpack('>H', chunk['data'])[0]
-                        print(f"  Wartość szarości: {gray_value}")
-                    elif color_type == 2:  # RGB
-                        r, g, b = struct.unpack('>BBB', chunk['data'][:3])
-                        print(f"  Kolor RGB: ({r}, {g}, {b})")
-                    elif color_type == 3:  # Paleta
-                        palette_index = chunk['data'][0]
-                        print(f"  Indeks palety: {palette_index}")
-                    elif color_type == 4:  # Skala szarości + alfa
-                        gray_value, alpha_value = struct.unpack('>HB', chunk['data'])
-                        print(f"  Wartość szarości: {gray_value}, Wartość alfa: {alpha_value}")
-                    elif color_type == 6:  # RGB + alfa
-                        r, g, b, alpha = struct.unpack('>BBBB', chunk['data'][:4])
-                        print(f"  Kolor RGBA: ({r}, {g}, {b}, {alpha})")
-                except Exception as e:
-                    print(f"  Błąd dekodowania koloru tła: {e}")
-
-
-        elif chunk['type'] == 'pHYs':
-            found_ancillary = True
-            try:
-                pixels_per_unit_x, pixels_per_unit_y, unit_specifier = struct.unpack('>IIB', chunk['data'])
-                units = {0: 'Brak jednostek (nieznane)', 1: 'Metr'}
-                print(f"\n[pHYs - Fizyczne wymiary piksela]")
-                print(f"  Piksele na jednostkę X: {pixels_per_unit_x}")
-                print(f"  Piksele na jednostkę Y: {pixels_per_unit_y}")
-                print(f"  Jednostka: {units.get(unit_specifier, 'Nieznana')}")
-            except Exception as e:
-                print(f"\n[pHYs - Fizyczne wymiary piksela] (Błąd dekodowania: {e})")
-
-
+    for _, title, record in iter_ancillary_records(chunks, color_type, bit_depth):
+        found_ancillary = True
+        if isinstance(record, Exception):
+            print(f"\n[{title}] (Błąd dekodowania: {record})")
+            continue
+        try:
+            # Pola leniwe (np. skompresowany tekst) są dekodowane dopiero tutaj
+            lines = [f"  {label}: {value}" if label else f"{value}" for label, value in record.fields()]
+        except Exception as e:
+            print(f"\n[{title}] (Błąd dekodowania/dekompresji: {e})")
+            continue
+        print(f"\n[{title}]")
+        for line in lines:
+            print(line)
 
     if not found_ancillary:
         print("Brak wykrytych dodatkowych chunków.")
 
 
-def anonymize_png(chunks, output_path):
-    """Anonimizuje PNG: usuwa niekrytyczne chunki i scala IDATy w jeden, zachowując poprawną kolejność."""
+ANONYMIZE_BUFFER_SIZE = 64 * 1024
+DEFAULT_IDAT_CHUNK_SIZE = 1024 * 1024
+# Największa dozwolona długość danych chunka (specyfikacja PNG: 2^31 - 1)
+MAX_CHUNK_LENGTH = 2 ** 31 - 1
+# Chunki animacji APNG - zachowywane przez anonimizator
+ANIMATION_CHUNK_TYPES = ('acTL', 'fcTL', 'fdAT')
+
+
+def chunk_payload(chunk):
+    """Dane chunku: dla PngChunk memoryview bez kopiowania, dla chunku-słownika chunk['data']."""
+    if isinstance(chunk, PngChunk):
+        return chunk.data
+    return chunk['data']
+
+
+def _write_chunk(f, chunk_type, data, crc=None):
+    """Zapisuje kompletny chunk; CRC liczone, jeśli nie podano."""
+    type_bytes = chunk_type.encode('ascii')
+    if crc is None:
+        crc = struct.pack('>I', zlib.crc32(data, zlib.crc32(type_bytes)) & 0xffffffff)
+    f.write(struct.pack('>I', len(data)))
+    f.write(type_bytes)
+    f.write(data)
+    f.write(crc)
+
+
+def write_png_chunks(output_path, chunks):
+    """Zapisuje plik PNG z listy par (typ, dane); CRC liczone są automatycznie."""
+    with open(output_path, 'wb') as f:
+        f.write(PNG_SIGNATURE)
+        for chunk_type, data in chunks:
+            _write_chunk(f, chunk_type, data)
+
+
+class _IdatWriter:
+    """
+    Strumieniowo zapisuje dane obrazu jako chunki IDAT z przyrostowym CRC.
+    chunk_size=None oznacza jeden chunk IDAT (wymaga strumienia z seek - długość
+    jest uzupełniana na końcu), a gdy dane przekroczą MAX_CHUNK_LENGTH - kolejne
+    chunki o tej długości. W przeciwnym razie dane dzielone są na chunki
+    o rozmiarze chunk_size.
+    """
+
+    def __init__(self, f, chunk_size=None):
+        if chunk_size is not None and not 0 < chunk_size <= MAX_CHUNK_LENGTH:
+            raise ValueError(f"Rozmiar chunka IDAT musi być z zakresu 1 - {MAX_CHUNK_LENGTH}")
+        if chunk_size is None and not _is_seekable(f):
+            chunk_size = DEFAULT_IDAT_CHUNK_SIZE
+        self.f = f
+        self.chunk_size = chunk_size
+        self.pending = bytearray()
+        self.length_pos = None
+        self.length = 0
+        self.crc = 0
+
+    def write(self, data):
+        if not data:
+            return
+        if self.chunk_size is None:
+            data = memoryview(data)
+            while data:
+                if self.length_pos is None:
+                    self.length_pos = self.f.tell()
+                    self.f.write(b'\x00\x00\x00\x00IDAT')
+                    self.crc = zlib.crc32(b'IDAT')
+                piece = data[:MAX_CHUNK_LENGTH - self.length]
+                self.f.write(piece)
+                self.crc = zlib.crc32(piece, self.crc)
+                self.length += len(piece)
+                data = data[len(piece):]
+                if self.length == MAX_CHUNK_LENGTH:
+                    self._finish_chunk()
+            return
+
+        self.pending += data
+        while len(self.pending) >= self.chunk_size:
+            _write_chunk(self.f, 'IDAT', memoryview(self.pending)[:self.chunk_size])
+            del self.pending[:self.chunk_size]
+
+    def _finish_chunk(self):
+        # Uzupełnia długość rozpoczętego chunka i dopisuje jego CRC
+        end = self.f.tell()
+        self.f.seek(self.length_pos)
+        self.f.write(struct.pack('>I', self.length))
+        self.f.seek(end)
+        self.f.write(struct.pack('>I', self.crc & 0xffffffff))
+        self.length_pos = None
+        self.length = 0
+
+    def close(self):
+        if self.chunk_size is None:
+            if self.length_pos is not None:
+                self._finish_chunk()
+        elif self.pending:
+            _write_chunk(self.f, 'IDAT', self.pending)
+            self.pending = bytearray()
+
+
+def _is_seekable(f):
+    try:
+        return f.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+
+def anonymize_png(chunks, output_path, idat_chunk_size=None, recompress=False, level=9,
+                  strategy='default', filter_mode='heuristic', workers=None, compact_palette=False,
+                  pixels=None):
+    """
+    Anonimizuje PNG: usuwa niekrytyczne chunki i scala IDATy w jeden, zachowując poprawną kolejność.
+    Przy recompress=True dane obrazu są dekodowane i kompresowane ponownie z wybranym
+    poziomem i strategią zlib, filtrem wybieranym dla każdego wiersza (filter_mode)
+    oraz równoległą kompresją bloków w workers wątkach. Przeplot Adam7 jest wtedy usuwany.
+    compact_palette=True usuwa z palety obrazów paletowych nieużywane wpisy (z przenumerowaniem
+    indeksów i zmniejszeniem głębi bitowej, jeśli to możliwe) - wymaga ponownej kompresji.
+    pixels - opcjonalnie już zdekodowane piksele (unika ponownego dekodowania).
+    """
 
     ihdr = None
     plte = None
-    idat_data = b''
+    idat_chunks = []
     iend = None
+    # Chunki animacji APNG zachowują położenie względem IDAT (acTL i fcTL obrazu domyślnego przed nimi)
+    animation_before = []
+    animation_after = []
 
     for chunk in chunks:
         if chunk['type'] == 'IHDR':
@@ -239,42 +508,157 @@ def anonymize_png(chunks, output_path):
         elif chunk['type'] == 'PLTE':
             plte = chunk
         elif chunk['type'] == 'IDAT':
-            idat_data += chunk['data']
+            idat_chunks.append(chunk)
         elif chunk['type'] == 'IEND':
             iend = chunk
+        elif chunk['type'] in ANIMATION_CHUNK_TYPES:
+            (animation_after if idat_chunks else animation_before).append(chunk)
 
     # Sprawdź poprawność
     if ihdr is None or iend is None:
         raise ValueError("Brakuje obowiązkowego chunka IHDR lub IEND – plik PNG jest nieprawidłowy.")
 
-    # Zbuduj pojedynczy chunk IDAT
-    idat_chunk = None
-    if idat_data:
-        crc_input = b'IDAT' + idat_data
-        crc = zlib.crc32(crc_input) & 0xffffffff
-        idat_chunk = {
-            'length': len(idat_data),
-            'type': 'IDAT',
-            'data': idat_data,
-            'crc': struct.pack('>I', crc)
-        }
-
-    # Tworzymy listę w poprawnej kolejności
-    final_chunks = [ihdr]
-    if plte:
-        final_chunks.append(plte)
-    if idat_chunk:
-        final_chunks.append(idat_chunk)
-    final_chunks.append(iend)
-
-    # Zapisujemy nowy plik
+    ihdr_data, ihdr_crc = chunk_payload(ihdr), ihdr['crc']
+    ihdr_info = parse_ihdr_chunk(ihdr['data'])
+    compact_palette = compact_palette and ihdr_info['color_type'] == 3 and plte is not None
+    if animation_before or animation_after:
+        # Ramki fdAT nie są dekodowane, więc muszą pasować do palety i przeplotu z IHDR
+        if compact_palette:
+            raise ValueError("Kompaktowanie palety nie jest obsługiwane dla animacji APNG")
+        if recompress and ihdr_info['interlace_method'] != 0:
+            raise ValueError("Ponowna kompresja animacji APNG z przeplotem nie jest obsługiwana")
+    if recompress or compact_palette:
+        import png_decoder
+        import png_encoder
+        import png_palette
+        if strategy not in png_encoder.STRATEGIES:
+            raise ValueError(f"Nieznana strategia kompresji: {strategy}")
+        if pixels is None:
+            pixels = png_decoder.decode_chunks(chunks)
+        ihdr_info['interlace_method'] = 0
+        if compact_palette:
+            pixels, palette_entries, _, _ = png_palette.compact_palette(pixels, png_decoder.find_palette(chunks))
+            ihdr_info['bit_depth'] = png_palette.minimal_bit_depth(len(palette_entries))
+            plte = {'type': 'PLTE', 'data': palette_entries.tobytes(), 'crc': None}
+        ihdr_data, ihdr_crc = png_encoder.build_ihdr(ihdr_info['width'], ihdr_info['height'],
+                                                     ihdr_info['bit_depth'], ihdr_info['color_type']), None
+        idat_pieces = [png_encoder.encode_idat(pixels, ihdr_info, level, png_encoder.STRATEGIES[strategy],
+                                               filter_mode, workers)]
+    else:
+        idat_pieces = (chunk_payload(chunk) for chunk in idat_chunks)
+
+    # Zapisujemy nowy plik w poprawnej kolejności; IDATy są scalane bez sklejania w pamięci
     with open(output_path, 'wb') as f:
-        f.write(b'\x89PNG\r\n\x1a\n')
-        for chunk in final_chunks:
-            f.write(struct.pack('>I', chunk['length']))
-            f.write(chunk['type'].encode('ascii'))
-            f.write(chunk['data'])
-            f.write(chunk['crc'])
+        f.write(PNG_SIGNATURE)
+        _write_chunk(f, 'IHDR', ihdr_data, ihdr_crc)
+        if plte:
+            _write_chunk(f, 'PLTE', chunk_payload(plte), plte['crc'])
+        for chunk in animation_before:
+            _write_chunk(f, chunk['type'], chunk_payload(chunk), chunk['crc'])
+        idat_writer = _IdatWriter(f, idat_chunk_size)
+        for piece in idat_pieces:
+            idat_writer.write(piece)
+        idat_writer.close()
+        for chunk in animation_after:
+            _write_chunk(f, chunk['type'], chunk_payload(chunk), chunk['crc'])
+        _write_chunk(f, 'IEND', chunk_payload(iend), iend['crc'])
+
+    print(f"\nAnonimizacja zakończona. Zapisano jako '{output_path}'")
+    print("Usunięto wszystkie ancillary chunki i naprawiono kolejność.")
+
+
+def _read_exact(stream, size):
+    """Czyta dokładnie size bajtów ze strumienia (także nieprzeszukiwalnego)."""
+    data = stream.read(size)
+    if len(data) == size:
+        return data
+    parts = [data]
+    received = len(data)
+    while received < size:
+        part = stream.read(size - received)
+        if not part:
+            raise ValueError("Nieoczekiwany koniec pliku PNG – plik jest obcięty.")
+        parts.append(part)
+        received += len(part)
+    return b''.join(parts)
+
+
+def anonymize_png_stream(src, dst, idat_chunk_size=None, buffer_size=ANONYMIZE_BUFFER_SIZE):
+    """
+    Strumieniowa anonimizacja PNG o stałym zużyciu pamięci.
+    Kopiuje IHDR, PLTE i chunki animacji APNG, przepisuje dane IDAT i fdAT kawałkami
+    po buffer_size bajtów prosto z wejścia na wyjście (z przyrostowym CRC) i pomija
+    pozostałe chunki.
+    Opcjonalnie dzieli dane obrazu na chunki IDAT o rozmiarze idat_chunk_size.
+    """
+    if _read_exact(src, 8) != PNG_SIGNATURE:
+        raise ValueError("To nie jest prawidłowy plik PNG")
+
+    dst.write(PNG_SIGNATURE)
+    idat_writer = None
+    seen_ihdr = False
+    seen_iend = False
+
+    while not seen_iend:
+        header = src.read(8)
+        if not header:
+            break
+        if len(header) < 8:
+            header += _read_exact(src, 8 - len(header))
+        length, type_bytes = struct.unpack('>I4s', header)
+        chunk_type = type_bytes.decode('ascii')
+
+        if chunk_type == 'IDAT':
+            if not seen_ihdr:
+                raise ValueError("Chunk IDAT przed IHDR – plik PNG jest nieprawidłowy.")
+            if idat_writer is None:
+                idat_writer = _IdatWriter(dst, idat_chunk_size)
+            remaining = length
+            while remaining:
+                piece = _read_exact(src, min(remaining, buffer_size))
+                idat_writer.write(piece)
+                remaining -= len(piece)
+            _read_exact(src, 4)
+            continue
+
+        if chunk_type in ('IHDR', 'PLTE', 'IEND') or chunk_type in ANIMATION_CHUNK_TYPES:
+            if idat_writer is not None:
+                # Koniec danych IDAT - ostatni chunk IDAT musi trafić przed fcTL/fdAT i IEND
+                idat_writer.close()
+                idat_writer = None
+            if chunk_type == 'fdAT':
+                # Dane ramki APNG mogą być duże - kopiowane kawałkami jak IDAT
+                dst.write(header)
+                crc = zlib.crc32(type_bytes)
+                remaining = length
+                while remaining:
+                    piece = _read_exact(src, min(remaining, buffer_size))
+                    crc = zlib.crc32(piece, crc)
+                    dst.write(piece)
+                    remaining -= len(piece)
+                _read_exact(src, 4)
+                dst.write(struct.pack('>I', crc & 0xffffffff))
+                continue
+            data = _read_exact(src, length)
+            crc = _read_exact(src, 4)
+            seen_ihdr = seen_ihdr or chunk_type == 'IHDR'
+            seen_iend = chunk_type == 'IEND'
+            _write_chunk(dst, chunk_type, data, crc)
+            continue
+
+        # Chunk dodatkowy - pomijamy bez wczytywania całości do pamięci
+        remaining = length + 4
+        while remaining:
+            remaining -= len(_read_exact(src, min(remaining, buffer_size)))
+
+    if not seen_ihdr or not seen_iend:
+        raise ValueError("Brakuje obowiązkowego chunka IHDR lub IEND – plik PNG jest nieprawidłowy.")
+
+
+def anonymize_png_file(input_path, output_path, idat_chunk_size=None, buffer_size=ANONYMIZE_BUFFER_SIZE):
+    """Strumieniowa anonimizacja plik-plik (patrz anonymize_png_stream)."""
+    with open(input_path, 'rb') as src, open(output_path, 'wb') as dst:
+        anonymize_png_stream(src, dst, idat_chunk_size, buffer_size)
 
     print(f"\nAnonimizacja zakończona. Zapisano jako '{output_path}'")
     print("Usunięto wszystkie ancillary chunki i naprawiono kolejność.")
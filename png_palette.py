@@ -0,0 +1,65 @@
+import numpy as np
+
+import png_decoder
+from utils import parse_ihdr_chunk
+
+PALETTE_BIT_DEPTHS = (1, 2, 4, 8)
+
+
+def palette_entries(palette_data):
+    """Wpisy palety PLTE jako tablica (liczba wpisów, 3)."""
+    count = len(palette_data) // 3
+    return np.frombuffer(palette_data, dtype=np.uint8, count=count * 3).reshape(count, 3)
+
+
+def palette_usage(indices, num_entries):
+    """Liczba pikseli używających każdego wpisu palety (np.bincount)."""
+    usage = np.bincount(np.asarray(indices).ravel(), minlength=num_entries)
+    if usage.size > num_entries:
+        raise ValueError("Obraz odwołuje się do indeksów spoza palety")
+    return usage
+
+
+def chunk_palette_usage(chunks):
+    """
+    Dekoduje indeksy obrazu paletowego i zwraca histogram użycia wpisów palety
+    albo None, jeśli obraz nie jest paletowy.
+    """
+    ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+    palette = png_decoder.find_palette(chunks)
+    if ihdr_info['color_type'] != 3 or palette is None:
+        return None
+    return palette_usage(png_decoder.decode_chunks(chunks), len(palette))
+
+
+def minimal_bit_depth(num_entries):
+    """Najmniejsza głębia bitowa obrazu paletowego pozwalająca zapisać num_entries wpisów."""
+    for bit_depth in PALETTE_BIT_DEPTHS:
+        if num_entries <= 1 << bit_depth:
+            return bit_depth
+    raise ValueError("Paleta może mieć najwyżej 256 wpisów")
+
+
+def compact_palette(indices, palette, transparency=None):
+    """
+    Usuwa nieużywane wpisy palety i przenumerowuje indeksy pikseli przez tablicę LUT.
+    transparency - opcjonalne wartości alfa z chunka tRNS (mogą być krótsze od palety).
+    Zwraca (nowe indeksy, nowa paleta, nowe alfa lub None, LUT stary->nowy indeks).
+    """
+    usage = palette_usage(indices, len(palette))
+    used = np.flatnonzero(usage)
+
+    lut = np.zeros(max(256, len(palette)), dtype=np.uint8)
+    lut[used] = np.arange(used.size, dtype=np.uint8)
+    new_indices = lut[indices]
+    new_palette = palette[used]
+
+    new_transparency = None
+    if transparency is not None:
+        alpha = np.full(len(palette), 255, dtype=np.uint8)
+        alpha[:len(transparency)] = transparency[:len(palette)]
+        alpha = alpha[used]
+        # tRNS może pominąć końcowe w pełni nieprzezroczyste wpisy
+        opaque_tail = np.flatnonzero(alpha != 255)
+        new_transparency = alpha[:opaque_tail[-1] + 1] if opaque_tail.size else None
+    return new_indices, new_palette, new_transparency, lut
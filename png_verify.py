@@ -0,0 +1,143 @@
+import os
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from png_handler import TruncatedPngError, map_png_file
+
+ADLER_CHUNK_SIZE = 1024 * 1024
+# Mniejsze chunki sprawdzane są od razu - narzut zadania w puli przewyższa zysk
+PARALLEL_CRC_MIN_SIZE = 64 * 1024
+
+
+def _chunk_crc(chunk):
+    """CRC z typu i danych chunku; zlib.crc32 zwalnia GIL dla większych buforów."""
+    return zlib.crc32(chunk.data, zlib.crc32(chunk.type.encode('ascii'))) & 0xffffffff
+
+
+def _check_idat_stream(chunks):
+    """
+    Dekompresuje strumień IDAT porcjami (bez przechowywania wyniku), co sprawdza
+    sumę kontrolną Adler-32 zapisaną na końcu strumienia zlib.
+    Zwraca None, gdy strumień jest poprawny, w przeciwnym razie opis błędu.
+    """
+    decompressor = zlib.decompressobj()
+    try:
+        for chunk in chunks:
+            if chunk.type != 'IDAT':
+                continue
+            data = chunk.data
+            while data:
+                decompressor.decompress(data, ADLER_CHUNK_SIZE)
+                data = decompressor.unconsumed_tail
+        decompressor.flush()
+    except zlib.error as e:
+        return str(e)
+    if not decompressor.eof:
+        return "strumień zlib jest niekompletny"
+    return None
+
+
+def verify_chunks(chunks, check_adler=False, executor=None):
+    """
+    Sprawdza CRC wszystkich chunków z indeksu (lista PngChunk z map_png_file).
+    Z podanym executorem CRC chunków od PARALLEL_CRC_MIN_SIZE bajtów liczone są równolegle.
+    Zwraca raport: liczba chunków, lista uszkodzonych chunków oraz wynik
+    sprawdzenia strumienia IDAT (None, jeśli go nie sprawdzano).
+    """
+    if executor is not None:
+        futures = {index: executor.submit(_chunk_crc, chunk) for index, chunk in enumerate(chunks)
+                   if chunk.length >= PARALLEL_CRC_MIN_SIZE}
+        actual_crcs = [futures[index].result() if index in futures else _chunk_crc(chunk)
+                       for index, chunk in enumerate(chunks)]
+    else:
+        actual_crcs = [_chunk_crc(chunk) for chunk in chunks]
+
+    bad_chunks = []
+    for index, (chunk, actual) in enumerate(zip(chunks, actual_crcs)):
+        expected = int.from_bytes(chunk.crc, 'big')
+        if actual != expected:
+            bad_chunks.append({
+                'index': index,
+                'type': chunk.type,
+                'offset': chunk.offset - 8,
+                'length': chunk.length,
+                'expected_crc': f"{expected:08x}",
+                'actual_crc': f"{actual:08x}",
+            })
+
+    truncated = not chunks or chunks[-1].type != 'IEND'
+    report = {
+        'ok': not bad_chunks and not truncated,
+        'chunks': len(chunks),
+        'bad_chunks': bad_chunks,
+        'truncated': truncated,
+        'idat_error': None,
+        'idat_ok': None,
+    }
+    if check_adler:
+        report['idat_error'] = _check_idat_stream(chunks)
+        report['idat_ok'] = report['idat_error'] is None
+        report['ok'] = report['ok'] and report['idat_ok']
+    return report
+
+
+def verify_png(file_path, check_adler=False, executor=None):
+    """Weryfikuje integralność pojedynczego pliku PNG (patrz verify_chunks)."""
+    try:
+        chunks = map_png_file(file_path)
+    except TruncatedPngError as e:
+        # Kompletne chunki obciętego pliku nadal sprawdzamy; raport ma truncated=True
+        chunks = e.chunks
+    except (OSError, ValueError) as e:
+        return {'path': file_path, 'ok': False, 'error': str(e)}
+    report = verify_chunks(chunks, check_adler, executor)
+    report['path'] = file_path
+    report['error'] = None
+    return report
+
+
+def verify_paths(paths, check_adler=False, workers=None):
+    """
+    Weryfikuje wiele plików równolegle w puli wątków (mmap i crc32 zwalniają GIL).
+    CRC chunków każdego pliku liczone są w osobnej puli wątków - zadania plików czekają
+    na nie, więc nie mogą współdzielić jednej puli bez ryzyka zakleszczenia.
+    Raporty zwracane są w kolejności ukończenia; liczba jednocześnie
+    przetwarzanych plików jest ograniczona, więc ścieżki mogą być dowolnie długim iteratorem.
+    """
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    max_pending = workers * 4
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            ThreadPoolExecutor(max_workers=workers) as chunk_executor:
+        pending = set()
+        for path in paths:
+            pending.add(executor.submit(verify_png, path, check_adler, chunk_executor))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
+
+
+def print_verify_report(report):
+    """Wyświetla raport weryfikacji w czytelnej postaci."""
+    print(f"\n=== Weryfikacja integralności: {report['path']} ===")
+    if report.get('error'):
+        print(f"Błąd: {report['error']}")
+        return
+    print(f"Liczba chunków: {report['chunks']}")
+    if report['bad_chunks']:
+        print(f"Uszkodzone chunki: {len(report['bad_chunks'])}")
+        for bad in report['bad_chunks']:
+            print(f"  [{bad['index']}] {bad['type']} (offset {bad['offset']}, {bad['length']} bajtów): "
+                  f"CRC zapisane {bad['expected_crc']}, obliczone {bad['actual_crc']}")
+    else:
+        print("CRC wszystkich chunków poprawne.")
+    if report['truncated']:
+        print("Plik jest obcięty – brak chunka IEND.")
+    if report['idat_ok'] is not None:
+        if report['idat_ok']:
+            print("Strumień IDAT (zlib/Adler-32) poprawny.")
+        else:
+            print(f"Strumień IDAT uszkodzony: {report['idat_error']}")
+    print("Wynik: " + ("plik poprawny" if report['ok'] else "plik USZKODZONY"))
@@ -0,0 +1,305 @@
+import asyncio
+import io
+import json
+import math
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from urllib.parse import parse_qs, urlsplit
+
+import png_handler
+
+# Usługa działa lokalnie (localhost lub gniazdo Unix) i nie korzysta z sieci zewnętrznej.
+# Front asynchroniczny przyjmuje żądania HTTP, a zadania wykonuje rozgrzana pula procesów.
+JOBS = ('parse', 'verify', 'anonymize', 'fft')
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_TIMEOUT = 30.0
+MAX_BODY_SIZE = 64 * 1024 * 1024
+LATENCY_WINDOW = 1000
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+                504: 'Gateway Timeout'}
+
+
+class ServiceBusy(Exception):
+    """Kolejka zadań jest pełna - klient powinien ponowić żądanie później."""
+
+
+def _warm_worker():
+    # Ciężkie moduły ładowane raz przy starcie procesu, a nie przy pierwszym zadaniu
+    import batch  # noqa: F401
+    import image_processor  # noqa: F401
+    import png_encoder  # noqa: F401
+    import png_verify  # noqa: F401
+
+
+def _ping():
+    return os.getpid()
+
+
+def _bool_option(options, name):
+    return options.get(name, '0').lower() in ('1', 'true', 'yes')
+
+
+def _written_bytes(write):
+    """Wywołuje write(ścieżka) na pliku tymczasowym i zwraca jego zawartość."""
+    fd, path = tempfile.mkstemp(suffix='.png')
+    os.close(fd)
+    try:
+        write(path)
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def _fft_job(chunks, options):
+    import numpy as np
+    import image_processor
+    import png_encoder
+
+    result = image_processor.compute_fft_from_file(None, chunks, precision=options.get('precision', 'float64'))
+    magnitude = result['magnitude']
+    if options.get('format') == 'png':
+        # Widmo amplitudowe przeskalowane do 8-bitowego obrazu w skali szarości
+        low, high = float(magnitude.min()), float(magnitude.max())
+        scaled = (magnitude - low) * (255.0 / (high - low or 1.0))
+        pixels = scaled.astype(np.uint8)
+        height, width = pixels.shape
+        ihdr_data = png_encoder.build_ihdr(width, height, 8, 0)
+        ihdr_info = {'width': width, 'height': height, 'bit_depth': 8, 'color_type': 0, 'interlace_method': 0}
+        idat_data = png_encoder.encode_idat(pixels, ihdr_info, workers=1)
+        return _written_bytes(lambda path: png_handler.write_png_chunks(
+            path, [('IHDR', ihdr_data), ('IDAT', idat_data), ('IEND', b'')]))
+    height, width = magnitude.shape
+    return {'width': width, 'height': height,
+            'magnitude_min': float(magnitude.min()), 'magnitude_max': float(magnitude.max()),
+            'magnitude_mean': float(magnitude.mean())}
+
+
+def run_job(job, path=None, data=None, options=None):
+    """
+    Wykonuje jedno zadanie w procesie roboczym. Źródłem jest ścieżka (mapowana do pamięci)
+    albo surowe bajty pliku PNG. Zwraca słownik (odpowiedź JSON) lub bajty pliku PNG.
+    """
+    options = options or {}
+    chunks = png_handler.map_png_file(path) if path else png_handler.index_png_chunks(data)
+    # Funkcje png_handler raportują postęp na stdout - w usłudze jest on pomijany
+    with redirect_stdout(io.StringIO()):
+        if job == 'parse':
+            import batch
+            return batch.analyze_chunks(chunks, _bool_option(options, 'verify'))
+        if job == 'verify':
+            import png_verify
+            return png_verify.verify_chunks(chunks, check_adler=_bool_option(options, 'adler'))
+        if job == 'anonymize':
+            kwargs = dict(recompress=_bool_option(options, 'recompress'),
+                          compact_palette=_bool_option(options, 'compact_palette'),
+                          strategy=options.get('strategy', 'default'), workers=1)
+            if 'level' in options:
+                kwargs['level'] = int(options['level'])
+            return _written_bytes(lambda output: png_handler.anonymize_png(chunks, output, **kwargs))
+        if job == 'fft':
+            return _fft_job(chunks, options)
+    raise ValueError(f"Nieznane zadanie: {job}")
+
+
+def _percentile(sorted_values, fraction):
+    """Percentyl metodą najbliższej rangi."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class PngService:
+    """
+    Usługa PNG: ograniczona kolejka przed pulą procesów (workers zadań wykonywanych
+    jednocześnie + queue_size oczekujących). Po jej zapełnieniu żądania są odrzucane
+    (HTTP 503), a każde zadanie ma limit czasu (HTTP 504).
+    """
+
+    def __init__(self, workers=None, queue_size=DEFAULT_QUEUE_SIZE, timeout=DEFAULT_TIMEOUT,
+                 max_body_size=MAX_BODY_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.max_body_size = max_body_size
+        self.executor = None
+        self.started = time.monotonic()
+        self.pending = 0
+        self.running = 0
+        self.counters = {'completed': 0, 'errors': 0, 'rejected': 0, 'timeouts': 0}
+        self.latencies = {job: deque(maxlen=LATENCY_WINDOW) for job in JOBS}
+        self._slots = None
+        self._loop = None
+
+    async def start(self):
+        """Uruchamia pulę procesów i czeka, aż wszystkie procesy będą gotowe."""
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.workers)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        await asyncio.gather(*(self._loop.run_in_executor(self.executor, _ping) for _ in range(self.workers)))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future=None):
+        self.running -= 1
+        self._slots.release()
+
+    async def _dispatch(self, job, path, data, options):
+        await self._slots.acquire()
+        self.running += 1
+        try:
+            future = self.executor.submit(run_job, job, path, data, options)
+        except BaseException:
+            self._release()
+            raise
+        # Miejsce w puli zwalniane jest dopiero po zakończeniu procesu roboczego - także
+        # wtedy, gdy klient dostał już odpowiedź o przekroczeniu czasu
+        future.add_done_callback(lambda f: self._loop.call_soon_threadsafe(self._release, f))
+        return await asyncio.wrap_future(future)
+
+    async def submit(self, job, path=None, data=None, options=None):
+        """Kolejkuje zadanie; ServiceBusy przy pełnej kolejce, asyncio.TimeoutError po przekroczeniu czasu."""
+        if job not in JOBS:
+            raise ValueError(f"Nieznane zadanie: {job}")
+        if self.pending >= self.workers + self.queue_size:
+            self.counters['rejected'] += 1
+            raise ServiceBusy()
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._dispatch(job, path, data, options), self.timeout)
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            raise
+        except Exception:
+            self.counters['errors'] += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.latencies[job].append(time.perf_counter() - start)
+        self.counters['completed'] += 1
+        return result
+
+    def stats(self):
+        """Głębokość kolejki, liczniki i percentyle opóźnień (w milisekundach) dla każdego zadania."""
+        latency = {}
+        for job, values in self.latencies.items():
+            ordered = sorted(values)
+            latency[job] = {'count': len(ordered)}
+            for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+                value = _percentile(ordered, fraction)
+                latency[job][name] = None if value is None else round(value * 1000, 3)
+        return {
+            'uptime': round(time.monotonic() - self.started, 3),
+            'workers': self.workers,
+            'queue_depth': max(0, self.pending - self.running),
+            'queue_limit': self.queue_size,
+            'running': self.running,
+            **self.counters,
+            'latency_ms': latency,
+        }
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > self.max_body_size:
+            return method, target, None
+        body = await reader.readexactly(length) if length else b''
+        return method, target, body
+
+    async def _respond(self, writer, status, body, content_type='application/json', extra_headers=()):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json'
+        head = [f"HTTP/1.1 {status} {HTTP_REASONS[status]}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}", "Connection: close", *extra_headers]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        """Obsługuje jedno połączenie HTTP (jedno żądanie na połączenie)."""
+        try:
+            status, body, headers = await self._route(reader)
+            await self._respond(writer, status, body, 'image/png', headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, reader):
+        try:
+            request = await self._read_request(reader)
+        except (ValueError, UnicodeDecodeError):
+            return 400, {'error': "Nieprawidłowe żądanie HTTP"}, ()
+        if request is None:
+            return 400, {'error': "Puste żądanie"}, ()
+        method, target, body = request
+        if body is None:
+            return 413, {'error': f"Dane przekraczają {self.max_body_size} bajtów"}, ()
+
+        url = urlsplit(target)
+        job = url.path.strip('/')
+        options = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if job == 'stats':
+            return 200, self.stats(), ()
+        if job not in JOBS:
+            return 404, {'error': f"Nieznana ścieżka: {url.path}", 'jobs': list(JOBS)}, ()
+        if method not in ('GET', 'POST'):
+            return 405, {'error': f"Metoda {method} nie jest obsługiwana"}, ()
+
+        path = options.pop('path', None)
+        if not path and not body:
+            return 400, {'error': "Podaj parametr path albo dane PNG w treści żądania"}, ()
+        try:
+            result = await self.submit(job, path, None if path else body, options)
+        except ServiceBusy:
+            return 503, {'error': "Kolejka zadań jest pełna"}, ("Retry-After: 1",)
+        except asyncio.TimeoutError:
+            return 504, {'error': f"Przekroczono limit czasu ({self.timeout} s)"}, ()
+        except FileNotFoundError as e:
+            return 404, {'error': f"Plik '{e.filename}' nie został znaleziony."}, ()
+        except ValueError as e:
+            return 400, {'error': f"Błąd przetwarzania pliku PNG: {e}"}, ()
+        except Exception as e:
+            return 500, {'error': f"{type(e).__name__}: {e}"}, ()
+        return 200, result, ()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, workers=None,
+                queue_size=DEFAULT_QUEUE_SIZE, timeout=DEFAULT_TIMEOUT):
+    """Uruchamia usługę na localhost (host:port) albo na gnieździe Unix i działa do przerwania."""
+    service = PngService(workers, queue_size, timeout)
+    await service.start()
+    try:
+        if socket_path:
+            server = await asyncio.start_unix_server(service.handle, path=socket_path)
+            address = socket_path
+        else:
+            server = await asyncio.start_server(service.handle, host, port)
+            address = f"http://{host}:{port}"
+        print(f"Usługa PNG nasłuchuje na {address} (procesy: {service.workers}, kolejka: {queue_size})")
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
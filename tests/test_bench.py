@@ -0,0 +1,51 @@
+"""Kontrola bramki regresji z benchmarks/bench.py na małym przypadku syntetycznym."""
+import copy
+import json
+
+import numpy as np
+from PIL import Image
+
+import bench
+from synthetic import write_synthetic_png
+
+CASE = ("rgb8_64", 64, 48, 2, 8, 1024)
+
+
+def _results(tmp_path):
+    case = bench.run_case(CASE, str(tmp_path), stages=('read', 'anonymize'), repeat=1, memory=True)
+    return {'version': 1, 'profile': 'test', 'cases': {CASE[0]: case}}
+
+
+def test_synthetic_png_is_valid(tmp_path):
+    path = tmp_path / 'synthetic.png'
+    write_synthetic_png(str(path), 33, 17, color_type=6, bit_depth=8, idat_chunk_size=100)
+    with Image.open(path) as image:
+        assert image.size == (33, 17) and image.mode == 'RGBA'
+        assert np.asarray(image).std() > 0
+
+
+def test_quick_case_round_trips_through_json(tmp_path):
+    results = _results(tmp_path)
+    stages = results['cases'][CASE[0]]['stages']
+    assert set(stages) == {'read', 'anonymize'}
+    assert all(values['seconds'] > 0 and values['peak_bytes'] > 0 for values in stages.values())
+
+    baseline = json.loads(json.dumps(results))
+    assert bench.compare(results, baseline) == []
+
+
+def test_compare_flags_injected_regression(tmp_path):
+    baseline = _results(tmp_path)
+    current = copy.deepcopy(baseline)
+    stage = current['cases'][CASE[0]]['stages']['read']
+    stage['seconds'] = baseline['cases'][CASE[0]]['stages']['read']['seconds'] * 2 + 1
+    stage['peak_bytes'] += 10 * bench.NOISE_FLOOR['peak_bytes']
+
+    regressions = bench.compare(current, baseline, tolerance=0.25)
+    assert {(item['stage'], item['metric']) for item in regressions} == {('read', 'seconds'), ('read', 'peak_bytes')}
+
+
+def test_compare_ignores_changes_below_noise_floor():
+    baseline = {'cases': {'a': {'stages': {'read': {'seconds': 0.0001, 'peak_bytes': 1000}}}}}
+    current = {'cases': {'a': {'stages': {'read': {'seconds': 0.0009, 'peak_bytes': 3000}}}}}
+    assert bench.compare(current, baseline) == []
@@ -0,0 +1,68 @@
+"""Szyfrowanie i deszyfrowanie plików z katalogu test/ musi zwracać dokładnie te same piksele."""
+import glob
+import os
+
+import numpy as np
+import pytest
+
+import png_crypto
+import png_decoder
+import png_handler
+from utils import parse_ihdr_chunk
+
+TEST_FILES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                           'test', '*.png')))
+KEY = png_crypto.key_from_passphrase('emedia', bytes(png_crypto.KDF_SALT_SIZE), iterations=1)
+
+
+@pytest.mark.parametrize('mode', png_crypto.MODES)
+@pytest.mark.parametrize('length', [0, 5, 8, 255, 257, png_crypto.CBC_BATCH_SIZE + 13])
+def test_bytes_round_trip(mode, length):
+    data = np.random.default_rng(length).integers(0, 256, length, dtype=np.uint8).tobytes()
+    iv = bytes(range(png_crypto.BLOCK_SIZE))
+    cipher = png_crypto.encrypt_bytes(data, KEY, mode, iv, workers=1)
+    assert len(cipher) == length
+    assert png_crypto.decrypt_bytes(cipher, KEY, mode, iv, workers=1) == data
+
+
+def test_cbc_independent_of_piece_sizes():
+    data = np.random.default_rng(0).integers(0, 256, 10_000, dtype=np.uint8).tobytes()
+    iv = bytes(png_crypto.BLOCK_SIZE)
+    pieces = [data[start:start + 97] for start in range(0, len(data), 97)]
+    assert b''.join(png_crypto.iter_cbc_encrypt(pieces, KEY, iv)) == png_crypto.encrypt_bytes(data, KEY, 'cbc', iv)
+
+
+@pytest.mark.parametrize('mode', png_crypto.MODES)
+@pytest.mark.parametrize('path', TEST_FILES, ids=os.path.basename)
+def test_png_round_trip(tmp_path, path, mode):
+    chunks = png_handler.map_png_file(path)
+    encrypted_path = str(tmp_path / 'encrypted.png')
+    decrypted_path = str(tmp_path / 'decrypted.png')
+
+    png_crypto.encrypt_png(chunks, encrypted_path, 'emedia', mode, workers=1, kdf_iterations=1)
+    png_crypto.decrypt_png(png_handler.map_png_file(encrypted_path), decrypted_path, 'emedia', workers=1)
+
+    decrypted = png_handler.map_png_file(decrypted_path)
+    ihdr_info = parse_ihdr_chunk(chunks[0]['data'])
+    rgba = png_decoder.to_rgba(png_decoder.decode_chunks(chunks), ihdr_info, png_decoder.find_palette(chunks),
+                               png_decoder.find_transparency(chunks))
+    decrypted_rgba = png_decoder.to_rgba(png_decoder.decode_chunks(decrypted), ihdr_info,
+                                         png_decoder.find_palette(decrypted), png_decoder.find_transparency(decrypted))
+    assert np.array_equal(decrypted_rgba, rgba)
+    assert png_decoder.find_transparency(decrypted) == png_decoder.find_transparency(chunks)
+    # Chunki dodatkowe (tRNS, gAMA, tekstowe...) przechodzą bez zmian i w tej samej kolejności
+    ancillary = [(chunk.type, bytes(chunk['data'])) for chunk in chunks if chunk.type not in ('IHDR', 'PLTE', 'IDAT', 'IEND')]
+    assert [(chunk.type, bytes(chunk['data'])) for chunk in decrypted
+            if chunk.type not in ('IHDR', 'PLTE', 'IDAT', 'IEND')] == ancillary
+
+
+def test_wrong_passphrase_changes_pixels(tmp_path):
+    path = os.path.join(os.path.dirname(TEST_FILES[0]), 'input.png')
+    chunks = png_handler.map_png_file(path)
+    encrypted_path = str(tmp_path / 'encrypted.png')
+    decrypted_path = str(tmp_path / 'decrypted.png')
+
+    png_crypto.encrypt_png(chunks, encrypted_path, 'emedia', workers=1, kdf_iterations=1)
+    png_crypto.decrypt_png(png_handler.map_png_file(encrypted_path), decrypted_path, 'inne', workers=1)
+    assert not np.array_equal(png_decoder.decode_chunks(png_handler.map_png_file(decrypted_path)),
+                              png_decoder.decode_chunks(chunks))
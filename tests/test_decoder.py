@@ -0,0 +1,29 @@
+"""Blokowe odwracanie filtrów (fala po przekątnych) musi dawać te same bajty co wiersz po wierszu."""
+import numpy as np
+import pytest
+
+import png_decoder
+
+
+@pytest.mark.parametrize('bpp, width', [(1, 300), (2, 257), (3, 500), (4, 64), (6, 33), (8, 90)])
+@pytest.mark.parametrize('filter_types', [(3,), (4,), (0, 1, 2, 3, 4)])
+def test_unfilter_rows_matches_scanlines(bpp, width, filter_types):
+    rng = np.random.default_rng(bpp * width)
+    rows = 200
+    lines = rng.integers(0, 256, (rows, bpp * width), dtype=np.uint8)
+    filters = rng.choice(filter_types, rows).astype(np.uint8)
+    prior = rng.integers(0, 256, bpp * width, dtype=np.uint8)
+
+    expected = []
+    previous = prior
+    for filter_type, line in zip(filters, lines):
+        previous = png_decoder.unfilter_scanline(filter_type, line, previous, bpp)
+        expected.append(previous)
+    assert np.array_equal(png_decoder._unfilter_wavefront(filters, lines, prior, bpp), np.array(expected))
+    assert np.array_equal(png_decoder.unfilter_rows(filters, lines, prior, bpp), np.array(expected))
+
+
+def test_unfilter_rows_rejects_unknown_filter():
+    lines = np.zeros((2, 8), dtype=np.uint8)
+    with pytest.raises(ValueError):
+        png_decoder.unfilter_rows(np.array([1, 5], dtype=np.uint8), lines, np.zeros(8, dtype=np.uint8), 4)
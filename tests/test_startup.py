@@ -0,0 +1,9 @@
+"""Lekkie polecenia CLI muszą startować bez NumPy/matplotlib/PIL i mieścić się w budżecie importów."""
+import pytest
+
+import startup_time
+
+
+@pytest.mark.parametrize('command', ['info', 'verify'])
+def test_import_time_within_budget(command):
+    assert startup_time.check_command(command, startup_time.DEFAULT_FILE, startup_time.DEFAULT_BUDGET_MS)